@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+admission.py -- Udacity conference server-side Python App Engine
+    token bucket admission control for contended write paths
+
+$Id$
+
+"""
+
+import hashlib
+import logging
+import time
+
+from google.appengine.api import memcache
+
+from settings import ADMISSION_CONTROL_ENABLED
+from settings import ADMISSION_LIMITS
+
+MEMCACHE_BUCKET_TPL = "ADMISSION:%s:%s"
+MEMCACHE_STATS_TPL = "ADMISSION_STATS:%s:%s"
+CAS_ATTEMPTS = 3
+
+
+class TokenBucket(object):
+    """TokenBucket -- memcache-backed token bucket, shared by all
+    instances, holding one bucket per resource"""
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        # an idle bucket is full again after this long, so let it expire
+        self.ttl = int(self.burst / self.rate) + 60
+
+    def take(self, resource):
+        """Take a token for resource; return 0 if admitted, otherwise
+        the number of seconds to wait before retrying."""
+        client = memcache.Client()
+        key = MEMCACHE_BUCKET_TPL % (
+            self.name, hashlib.sha1(resource).hexdigest())
+        seen = False
+        for _ in range(CAS_ATTEMPTS):
+            now = time.time()
+            state = client.gets(key)
+            if state is None:
+                if client.add(key, (self.burst - 1, now), time=self.ttl):
+                    return 0
+                continue
+            seen = True
+            tokens, stamp = state
+            tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+            if tokens < 1:
+                return (1 - tokens) / self.rate
+            if client.cas(key, (tokens - 1, now), time=self.ttl):
+                return 0
+        if not seen:
+            # memcache is unavailable; don't turn that into an outage
+            return 0
+        # lost every race for the bucket, so it is as hot as it gets
+        return 1 / self.rate
+
+
+BUCKETS = dict((name, TokenBucket(name, rate, burst))
+               for name, (rate, burst) in ADMISSION_LIMITS.items())
+
+
+def admit(operation, resource):
+    """Return 0 if operation on resource may proceed, otherwise the
+    number of seconds the client should wait before retrying."""
+    bucket = BUCKETS.get(operation)
+    if not ADMISSION_CONTROL_ENABLED or not bucket:
+        return 0
+    wait = bucket.take(resource)
+    outcome = 'shed' if wait else 'admitted'
+    memcache.incr(MEMCACHE_STATS_TPL % (operation, outcome), initial_value=0)
+    if wait:
+        logging.info('Shed %s on %s; retry after %.2fs',
+                     operation, resource, wait)
+    return wait
+
+
+def stats():
+    """Return limits & admitted/shed counts for every operation."""
+    keys = [MEMCACHE_STATS_TPL % (name, outcome)
+            for name in BUCKETS for outcome in ('admitted', 'shed')]
+    counts = memcache.get_multi(keys)
+    return dict((name, {
+        'enabled': ADMISSION_CONTROL_ENABLED,
+        'rate': bucket.rate,
+        'burst': bucket.burst,
+        'admitted': counts.get(MEMCACHE_STATS_TPL % (name, 'admitted'), 0),
+        'shed': counts.get(MEMCACHE_STATS_TPL % (name, 'shed'), 0),
+    }) for name, bucket in BUCKETS.items())
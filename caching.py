@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""
+caching.py -- Udacity conference server-side Python App Engine
+    tiered (instance, memcache, datastore) cache for hot computed values
+
+$Id$
+
+"""
+
+import logging
+import time
+
+from google.appengine.api import memcache
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
+
+from models import CacheEntry
+
+LOCAL_TTL = 5
+MEMCACHE_ENTRY_TPL = "TIERED_CACHE:%s"
+MEMCACHE_REFRESH_LOCK_TPL = "CACHE_REFRESH:%s"
+REFRESH_LOCK_TTL = 60
+
+CACHES = {}
+
+
+class TieredCache(object):
+    """TieredCache -- value cached per instance, in memcache and in the
+    datastore, served stale while a task rebuilds it in the background"""
+
+    def __init__(self, name, builder=None, freshFor=None, localTtl=LOCAL_TTL):
+        self.name = name
+        self.builder = builder
+        self.freshFor = freshFor
+        self.localTtl = localTtl
+        self._local = None
+        CACHES[name] = self
+
+    def get(self):
+        """Return (value, stamp) of the cached value, building it first
+        if no tier has a copy; stamp is the time the value last changed,
+        which rebuilds that come up with the same value leave alone."""
+        now = time.time()
+        if self._local and self._local[3] > now:
+            value, stamp, updated = self._local[:3]
+        else:
+            entry = memcache.get(MEMCACHE_ENTRY_TPL % self.name)
+            if entry is None:
+                stored = ndb.Key(CacheEntry, self.name).get()
+                if stored:
+                    entry = (stored.value, stored.changed, stored.updated)
+                    memcache.set(MEMCACHE_ENTRY_TPL % self.name, entry)
+            if entry is None:
+                if not self.builder:
+                    return None, 0
+                # nothing to serve stale; build it on this request,
+                # the builder stores it with set()
+                self.builder()
+                return self._local[:2] if self._local else (None, 0)
+            value, stamp, updated = entry
+            self._local = (value, stamp, updated, now + self.localTtl)
+
+        if self.freshFor and now - updated > self.freshFor:
+            self._refreshLater()
+        return value, stamp
+
+    def set(self, value):
+        """Write value through every tier; return the time it changed."""
+        updated = time.time()
+        stored = ndb.Key(CacheEntry, self.name).get()
+        if stored and stored.value == value:
+            changed = stored.changed
+        else:
+            changed = updated
+        CacheEntry(id=self.name, value=value, updated=updated,
+                   changed=changed).put()
+        memcache.set(MEMCACHE_ENTRY_TPL % self.name, (value, changed, updated))
+        self._local = (value, changed, updated, updated + self.localTtl)
+        return changed
+
+    def refresh(self):
+        """Rebuild the value now; the builder writes it with set()."""
+        memcache.delete(MEMCACHE_REFRESH_LOCK_TPL % self.name)
+        self.builder()
+
+    def _refreshLater(self):
+        """Queue one background rebuild, however many requests see it stale."""
+        if not self.builder or not memcache.add(
+                MEMCACHE_REFRESH_LOCK_TPL % self.name, 1, time=REFRESH_LOCK_TTL):
+            return
+        try:
+            taskqueue.add(params={'name': self.name}, url='/tasks/refresh_cache')
+        except taskqueue.Error:
+            logging.exception('Could not queue refresh of %s', self.name)
+            memcache.delete(MEMCACHE_REFRESH_LOCK_TPL % self.name)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""
+coalescing.py -- Udacity conference server-side Python App Engine
+    dirty marking & debounced batch processing for background recomputes
+
+$Id$
+
+Writes call markDirty(job, target) instead of queueing a task each.
+Every call stores a small mark row of its own, so that writes never
+contend on a shared mark, and one named task per job & time window
+collects them all, grouped by target, so a burst of writes to one
+conference costs a single recompute. Jobs with nothing to mark per
+target (global recomputes, queue drains) just call schedule(job).
+
+"""
+
+import hashlib
+import logging
+import time
+import uuid
+
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
+
+from models import DirtyMark
+
+WINDOW = 10
+# runs the task a little after its window closes, so that writes marked
+# just before the boundary have committed by the time it looks
+GRACE = 2
+BATCH_SIZE = 100
+TIME_BUDGET = 60
+
+JOBS = {}
+
+
+def registerJob(job, func, usesMarks=True, withIds=False):
+    """Have func([(target, payloads), ...]) process marks of job, or
+    have func() run once per window if the job uses no marks.
+
+    Marks are deleted after each batch, so a batch that fails partway
+    is handed over again; with withIds=True, payloads are (mark id,
+    payload) pairs, for jobs to skip the marks they already applied.
+    """
+    JOBS[job] = (func, usesMarks, withIds)
+
+
+@ndb.non_transactional
+def markDirty(job, target, item=None):
+    """Mark target dirty for job & make sure a batch run is scheduled.
+
+    item, if given, is handed to the job along with the items of every
+    other mark of target, in the order they were marked, so the job
+    sees everything that happened to target during the window.
+    """
+    DirtyMark(id='%s:%s:%s' % (job, hashlib.sha1(target).hexdigest(),
+                               uuid.uuid4().hex),
+              job=job, target=target, payload=item).put()
+    schedule(job)
+
+
+def markDirtyOnCommit(job, target, item=None):
+    """markDirty once the current transaction commits, or right away
+    outside of one.
+
+    The write being marked has committed by then, so a failure is
+    logged instead of raised: raising would have a retrying caller
+    run the committed write again. The repair mappers & rebuilds of
+    each job catch up with lost marks.
+    """
+    def mark():
+        try:
+            markDirty(job, target, item)
+        except Exception:
+            logging.exception('Lost %s mark of %s', job, target)
+    ndb.get_context().call_on_commit(mark)
+
+
+def schedule(job, delay=0):
+    """Queue the batch run of job for the end of the current window;
+    returns quietly if that run is already queued."""
+    now = time.time() + delay
+    bucket = int(now // WINDOW)
+    try:
+        taskqueue.add(name='coalesce-%s-%d' % (job.replace('_', '-'), bucket),
+                      params={'job': job}, url='/tasks/coalesced',
+                      countdown=(bucket + 1) * WINDOW - time.time() + GRACE)
+    except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+        pass
+
+
+def process(job):
+    """Hand every dirty mark of job to its function, batch by batch.
+
+    Makes a single pass: anything marked meanwhile has queued a run of
+    its own for the window it was marked in.
+    """
+    func, usesMarks, withIds = JOBS[job]
+    if not usesMarks:
+        func()
+        return
+    deadline = time.time() + TIME_BUDGET
+    q = DirtyMark.query(DirtyMark.job == job).order(DirtyMark.marked)
+    cursor, more = None, True
+    while more:
+        marks, cursor, more = q.fetch_page(BATCH_SIZE, start_cursor=cursor)
+        if not marks:
+            return
+        items = {}
+        for mark in marks:
+            target_items = items.setdefault(mark.target, [])
+            if mark.payload is not None:
+                target_items.append((mark.key.id(), mark.payload) if withIds
+                                    else mark.payload)
+        func(list(items.items()))
+        ndb.delete_multi([mark.key for mark in marks])
+
+        if more and time.time() > deadline:
+            logging.info('Coalesced %s out of time; continuing later', job)
+            schedule(job, delay=WINDOW)
+            return
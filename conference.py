@@ -8,51 +8,202 @@ created by wesc on 2014 apr 21
 """
 __author__ = 'wesc+api@google.com (Wesley Chun)'
 
+import time
+IMPORT_STARTED = time.time()
+
+from collections import OrderedDict
 from datetime import datetime
+from datetime import timedelta
+import itertools
+import json
+import logging
+import operator
+import re
+import zlib
 
 import endpoints
 from protorpc import messages
 from protorpc import message_types
 from protorpc import remote
 
+from google.appengine.api import datastore_errors
 from google.appengine.api import memcache
 from google.appengine.api import taskqueue
 from google.appengine.ext import ndb
 
 
+from models import Agenda
+from models import AgendaForm
+from models import AgendaItemForm
 from models import BooleanMessage
 from models import Conference
 from models import ConferenceForm
 from models import ConferenceForms
 from models import ConferenceQueryForm
 from models import ConferenceQueryForms
+from models import ConferenceStats
+from models import ConferenceStatsForm
+from models import ConferenceStatsForms
+from models import ConferenceSummaryForm
+from models import ConferenceSummaryForms
 from models import ConflictException
+from models import ConferenceFacetsForm
+from models import FacetCount
+from models import FacetDeltaBatch
+from models import FacetValueForm
+from models import FeaturedSpeaker
+from models import FeaturedSpeakerForm
+from models import FeaturedSpeakerForms
+from models import NotModifiedException
+from models import ServiceUnavailableException
 from models import Profile
 from models import ProfileMiniForm
 from models import ProfileForm
+from models import RecommendationBuild
+from models import RecommendationCounts
+from models import RecommendedSessionForm
+from models import RecommendedSessionForms
+from models import RequestOutcome
 from models import StringMessage
 from models import Session
 from models import SessionForm
 from models import SessionForms
+from models import SessionKeyMove
+from models import SessionRecommendations
+from models import SessionStatsForm
+from models import SessionSummaryForm
+from models import SessionSummaryForms
+from models import Speaker
+from models import SpeakerForm
+from models import SearchDocument
+from models import SearchPosting
 from models import TeeShirtSize
+from models import Topic
+from models import TopicMembership
+from models import WebsafeKeysForm
+from models import WaitlistEntry
 
 from settings import WEB_CLIENT_ID
 from settings import ANDROID_CLIENT_ID
 from settings import IOS_CLIENT_ID
 from settings import ANDROID_AUDIENCE
 
+from admission import admit
+from caching import TieredCache
+import coalescing
+import mapper
+from recommendations import CooccurrenceCounter
+from recommendations import addPairDeltas
+from recommendations import inShard
+from recommendations import mergeDeltas
+from search import rankDocuments
+from search import tokenize
+from search import weighTokens
+from utils import SESSION_ID_PREFIX
 from utils import getUserId
+from utils import runInTransaction
+from utils import normalizeEmail
+from utils import normalizeTopic
+from utils import sessionClientId
+from utils import sessionKey
 
 EMAIL_SCOPE = endpoints.EMAIL_SCOPE
 API_EXPLORER_CLIENT_ID = endpoints.API_EXPLORER_CLIENT_ID
 MEMCACHE_ANNOUNCEMENTS_KEY = "RECENT_ANNOUNCEMENTS"
+ANNOUNCEMENT_SEATS = 5
 ANNOUNCEMENT_TPL = ('Last chance to attend! The following conferences '
                     'are nearly sold out: %s')
 
 MEMCACHE_FEATURED_SPEAKER_KEY = "FEATURED_SPEAKER"
+MEMCACHE_CONF_FEATURED_SPEAKER_TPL = "FEATURED_SPEAKER:%s"
+FEATURED_SPEAKER_ID = "featured"
+# conferences without a featured speaker are remembered for this long
+FEATURED_SPEAKER_MISS_TTL = 60
 SPEAKER_TPL = ('Come see our featured speaker %s in one of the'
                ' following sessions: ')
 
+# served stale & rebuilt in the background once older than this; the
+# hourly cron normally rebuilds the announcement before it gets there
+ANNOUNCEMENT_FRESH_FOR = 3600
+ANNOUNCEMENT_CACHE = TieredCache(
+    MEMCACHE_ANNOUNCEMENTS_KEY,
+    builder=lambda: ConferenceApi._cacheAnnouncement(),
+    freshFor=ANNOUNCEMENT_FRESH_FOR)
+# latest featured speaker across all conferences; only ever replaced
+# by the featured speaker task, never rebuilt
+FEATURED_SPEAKER_CACHE = TieredCache(MEMCACHE_FEATURED_SPEAKER_KEY)
+
+MEMCACHE_VERSION_TPL = "VERSION:%s"
+
+FACETS = ('city', 'topic', 'month')
+FACET_TXN_GROUPS = 20
+FACET_DELTAS_QUEUE = 'facet-deltas'
+FACET_DELTAS_LEASE = 1000
+# delta batch ids remembered per counter; far more than can be retried
+FACET_APPLIED_IDS = 20
+# held while facet counters are written, so that the drain & the
+# rebuild never run at once; outlives any run of either
+MEMCACHE_FACETS_LOCK_KEY = "FACETS_LOCK"
+FACETS_LOCK_TTL = 600
+
+# how long replays of a client request ID return the original outcome
+REQUEST_OUTCOME_TTL = timedelta(days=1)
+
+# marks a rollup remembers; more than one coalesced batch holds
+STATS_APPLIED_IDS = 2 * coalescing.BATCH_SIZE
+STATS_ID = "stats"
+
+AGENDA_ID = "agenda"
+AGENDA_BUILD_ATTEMPTS = 3
+# agendas refreshed per coalesced batch; the rest are re-marked
+AGENDA_REFRESH_BATCH = 200
+
+# conferences primed per landing page by the warmup request
+WARMUP_CONFERENCES = 20
+
+# conference + one profile per promotion must fit in one xg transaction
+WAITLIST_BATCH = 20
+
+SEARCH_DOCUMENT_ID = "search"
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_MAX_QUERY_TOKENS = 8
+# only the heaviest postings of a term are ranked; all are counted, up
+# to SEARCH_MAX_COUNT, for how rare the term is
+SEARCH_MAX_POSTINGS = 1000
+SEARCH_MAX_COUNT = 10000
+
+BATCH_GET_MAX_KEYS = 100
+
+# deleted conferences & sessions are cleaned up by a chain of tasks,
+# each taking this many profiles or stored entities...
+CLEANUP_QUEUE = 'cleanup'
+CLEANUP_BATCH = 100
+# ...or this many sessions of a deleted conference
+CLEANUP_SESSIONS = 10
+
+RECOMMENDATIONS_ID = "recommended"
+RECOMMENDATIONS_K = 10
+# neighbor counters kept per session while counting; more of them
+# makes the counts of the top K more exact
+RECOMMENDATIONS_CAPACITY = 50
+# full rebuilds count the sessions of each shard in a task of its own
+RECOMMENDATIONS_SHARDS = 4
+RECOMMENDATIONS_BATCH = 100
+# wishlists longer than this only count their most recent sessions
+RECOMMENDATIONS_MAX_OTHERS = 100
+# a rebuild task counting for longer than this checkpoints its counts
+# & leaves the rest of the profiles to the next task of the chain
+RECOMMENDATIONS_TIME_BUDGET = 300
+# leaves room under the datastore's 1MB entity limit
+RECOMMENDATIONS_CHUNK_BYTES = 900 * 1024
+RECOMMENDATIONS_BUILD_TPL = '%s-%d-of-%d'
+
+TIMELINE_PAGE_SIZE = 20
+TIMELINE_MAX_PAGE_SIZE = 100
+TIMELINE_WEEK_RE = re.compile(r'^(\d{4})-W(\d{2})$')
+TIMELINE_MONTH_RE = re.compile(r'^(\d{4})-(\d{2})$')
+
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 DEFAULTS = {
@@ -71,6 +222,25 @@ OPERATORS = {
             'NE':   '!='
             }
 
+# the same operators, for filtering conferences loaded by topic
+FILTER_TESTS = {
+            '=':  operator.eq,
+            '>':  operator.gt,
+            '>=': operator.ge,
+            '<':  operator.lt,
+            '<=': operator.le,
+            '!=': operator.ne,
+            }
+
+# topic filters load the conferences of a topic with at most this many
+# directly; when every topic is bigger, the query is scanned instead &
+# only this many results are returned
+TOPIC_JOIN_LIMIT = 1000
+TOPIC_JOIN_BATCH = 100
+
+# indexed properties projected by the summary listings
+SUMMARY_FIELDS = ('name', 'city', 'startDate', 'endDate', 'seatsAvailable')
+
 FIELDS = {
         'CITY': 'city',
         'TOPIC': 'topics',
@@ -96,6 +266,19 @@ SESS_GET_REQUEST = endpoints.ResourceContainer(
 SESS_POST_REQUEST = endpoints.ResourceContainer(
     message_types.VoidMessage,
     webSafeKey=messages.StringField(1),
+    requestId=messages.StringField(2),
+)
+
+CONF_REGISTER_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKey=messages.StringField(1),
+    requestId=messages.StringField(2),
+)
+
+WISHLIST_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKey=messages.StringField(1),
+    requestId=messages.StringField(2),
 )
 
 SESS_TYPE_GET_REQUEST = endpoints.ResourceContainer(
@@ -113,6 +296,12 @@ SPKR_POST_REQUEST = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeKey=messages.StringField(1),
     speaker=messages.StringField(2),
+    speakerEmail=messages.StringField(3),
+)
+
+SPKR_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    speakerEmail=messages.StringField(1),
 )
 
 SESS_SIZE_REQUEST = endpoints.ResourceContainer(
@@ -120,6 +309,33 @@ SESS_SIZE_REQUEST = endpoints.ResourceContainer(
     sessionSize=messages.IntegerField(1),
 )
 
+SESS_DELETE_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeSessionKey=messages.StringField(1),
+)
+
+RECOMMENDED_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeSessionKey=messages.StringField(1),
+)
+
+SEARCH_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    query=messages.StringField(1),
+    pageToken=messages.StringField(2),
+    limit=messages.IntegerField(3),
+)
+
+TIMELINE_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    startDate=messages.StringField(1),
+    endDate=messages.StringField(2),
+    week=messages.StringField(3),
+    month=messages.StringField(4),
+    pageToken=messages.StringField(5),
+    limit=messages.IntegerField(6),
+)
+
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 
@@ -130,6 +346,47 @@ SESS_SIZE_REQUEST = endpoints.ResourceContainer(
 class ConferenceApi(remote.Service):
     """Conference API v0.1"""
 
+# - - - Version stamps & ETags - - - - - - - - - - - - - - -
+
+    @staticmethod
+    def _getVersions(*scopes):
+        """Return current version stamps for scopes, seeding missing ones."""
+        keys = [MEMCACHE_VERSION_TPL % scope for scope in scopes]
+        stamps = memcache.get_multi(keys)
+        missing = [key for key in keys if key not in stamps]
+        if missing:
+            # seed from the clock so that a stamp lost to eviction
+            # never reuses a value a client may still be holding
+            seed = int(time.time() * 1000)
+            memcache.add_multi(dict((key, seed) for key in missing))
+            stamps.update(memcache.get_multi(missing))
+            for key in missing:
+                stamps.setdefault(key, seed)
+        return [stamps[key] for key in keys]
+
+    @staticmethod
+    def _bumpVersions(*scopes):
+        """Invalidate ETags of scopes once the current transaction commits."""
+        def bump():
+            memcache.offset_multi(
+                dict((MEMCACHE_VERSION_TPL % scope, 1) for scope in scopes),
+                initial_value=int(time.time() * 1000))
+        # runs immediately when called outside of a transaction
+        ndb.get_context().call_on_commit(bump)
+
+    def _ifNoneMatch(self):
+        """Return entity tags sent by the client in If-None-Match."""
+        headers = getattr(self.request_state, 'headers', None) or {}
+        header = headers.get('If-None-Match') or ''
+        return [tag.strip().replace('W/', '', 1) for tag in header.split(',')]
+
+    def _checkEtag(self, *scopes):
+        """Return ETag for scopes; raise NotModified if client has it."""
+        etag = '"%s"' % '.'.join(str(v) for v in self._getVersions(*scopes))
+        if etag in self._ifNoneMatch():
+            raise NotModifiedException()
+        return etag
+
 # - - - Conference objects - - - - - - - - - - - - - - - - -
 
     def _copyConferenceToForm(self, conf, displayName):
@@ -149,6 +406,61 @@ class ConferenceApi(remote.Service):
         cf.check_initialized()
         return cf
 
+    def _copySummaryToForm(self, entity, form, fixed=None):
+        """Copy projected fields from Conference/Session to summary form."""
+        fixed = fixed or {}
+        for field in form.all_fields():
+            if field.name == "websafeKey":
+                setattr(form, field.name, self._clientKey(entity.key))
+                continue
+            # equality-filtered properties can't be projected, so they
+            # come from the filter value instead of the entity
+            if field.name in fixed:
+                value = fixed[field.name]
+            else:
+                value = getattr(entity, field.name)
+            # convert Date to date string; just copy others
+            if field.name.endswith('Date'):
+                setattr(form, field.name, str(value))
+            else:
+                setattr(form, field.name, value)
+        form.check_initialized()
+        return form
+
+    def _copyConferencesToForms(self, conferences, nextPageToken=None):
+        """Copy Conferences to ConferenceForms, looking up the display
+        names of all their organizers in one batch."""
+        organisers = set(conf.organizerUserId for conf in conferences)
+        names = {}
+        for profile in ndb.get_multi(
+                [ndb.Key(Profile, user_id) for user_id in organisers]):
+            if profile:
+                names[profile.key.id()] = profile.displayName
+        return ConferenceForms(
+            items=[self._copyConferenceToForm(
+                conf, names.get(conf.organizerUserId)) for conf in conferences],
+            nextPageToken=nextPageToken
+        )
+
+    @staticmethod
+    def _parseDate(value, field):
+        """Return the date of a 'YYYY-MM-DD' string, ignoring any time
+        that follows it; raise BadRequest naming field otherwise."""
+        try:
+            return datetime.strptime(value[:10], "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            raise endpoints.BadRequestException(
+                "Invalid '%s' field; expected YYYY-MM-DD." % field)
+
+    @staticmethod
+    def _dateBuckets(day):
+        """Return (weekBucket, monthBucket) of day: ISO year * 100 + ISO
+        week and year * 100 + month, or (None, None) without a day."""
+        if not day:
+            return None, None
+        iso_year, iso_week = day.isocalendar()[:2]
+        return iso_year * 100 + iso_week, day.year * 100 + day.month
+
     def _createConferenceObject(self, request):
         """Create or update Conference object,
         returning ConferenceForm/request."""
@@ -165,6 +477,7 @@ class ConferenceApi(remote.Service):
         data = {field.name: getattr(request, field.name) for field in request.all_fields()}
         del data['websafeKey']
         del data['organizerDisplayName']
+        del data['etag']
 
         # add default values for those missing (both data model & outbound Message)
         for df in DEFAULTS:
@@ -172,18 +485,24 @@ class ConferenceApi(remote.Service):
                 data[df] = DEFAULTS[df]
                 setattr(request, df, DEFAULTS[df])
 
-        # convert dates from strings to Date objects; set month based on start_date
+        # convert dates from strings to Date objects; set month & the
+        # timeline buckets based on start_date
         if data['startDate']:
-            data['startDate'] = datetime.strptime(data['startDate'][:10], "%Y-%m-%d").date()
+            data['startDate'] = self._parseDate(data['startDate'], 'startDate')
             data['month'] = data['startDate'].month
         else:
             data['month'] = 0
+        data['weekBucket'], data['monthBucket'] = self._dateBuckets(
+            data['startDate'])
         if data['endDate']:
-            data['endDate'] = datetime.strptime(data['endDate'][:10], "%Y-%m-%d").date()
+            data['endDate'] = self._parseDate(data['endDate'], 'endDate')
 
         # set seatsAvailable to be same as maxAttendees on creation
         if data["maxAttendees"] > 0:
             data["seatsAvailable"] = data["maxAttendees"]
+        # swap topics for their topic dictionary entries
+        data['topics'], data['topicIds'] = self._resolveTopics(data['topics'])
+        request.topics = data['topics']
         # generate Profile Key based on user ID and Conference
         # ID based on Profile key get Conference key from ID
         p_key = ndb.Key(Profile, user_id)
@@ -194,7 +513,12 @@ class ConferenceApi(remote.Service):
 
         # create Conference, send email to organizer confirming
         # creation of Conference & return (modified) ConferenceForm
-        Conference(**data).put()
+        conf = Conference(**data)
+        conf.put()
+        self._updateStats(conf)
+        self._syncTopicMemberships(conf, [])
+        self._indexForSearch(conf)
+        self._queueFacetDeltas({}, self._facetValues(conf))
         taskqueue.add(params={'email': user.email(),
                               'conferenceInfo': repr(request)},
                       url='/tasks/send_confirmation_email'
@@ -222,6 +546,9 @@ class ConferenceApi(remote.Service):
         if user_id != conf.organizerUserId:
             raise endpoints.ForbiddenException(
                 'Only the owner can update the conference.')
+        facets = self._facetValues(conf)
+        topic_ids = conf.topicIds
+        seats, max_attendees = conf.seatsAvailable, conf.maxAttendees
 
         # Not getting all the fields, so don't create a new object; just
         # copy relevant fields from ConferenceForm to Conference object
@@ -231,12 +558,30 @@ class ConferenceApi(remote.Service):
             if data not in (None, []):
                 # special handling for dates (convert string to Date)
                 if field.name in ('startDate', 'endDate'):
-                    data = datetime.strptime(data, "%Y-%m-%d").date()
+                    data = self._parseDate(data, field.name)
                     if field.name == 'startDate':
                         conf.month = data.month
+                        conf.weekBucket, conf.monthBucket = \
+                            self._dateBuckets(data)
                 # write to Conference object
                 setattr(conf, field.name, data)
+        if request.topics:
+            conf.topics, conf.topicIds = self._resolveTopics(request.topics)
+        # growing or shrinking the conference moves its free seats along
+        if request.maxAttendees is not None and request.seatsAvailable is None:
+            conf.seatsAvailable = max(
+                0, (seats or 0) + conf.maxAttendees - (max_attendees or 0))
+        if conf.seatsAvailable > (seats or 0):
+            self._queueWaitlistPromotion(conf)
         conf.put()
+        self._updateStats(conf)
+        self._syncTopicMemberships(conf, topic_ids)
+        self._indexForSearch(conf)
+        self._queueFacetDeltas(facets, self._facetValues(conf))
+        self._seatsChanged(seats or 0, conf.seatsAvailable or 0)
+        self._bumpVersions('conference:%s' % conf.key.urlsafe())
+        # attendees' agendas pick up new names & dates in the next window
+        coalescing.markDirty('agendas', conf.key.urlsafe(), {'cursor': None})
         prof = ndb.Key(Profile, user_id).get()
         return self._copyConferenceToForm(conf, getattr(prof, 'displayName'))
 
@@ -258,14 +603,21 @@ class ConferenceApi(remote.Service):
                       http_method='GET', name='getConference')
     def getConference(self, request):
         """Return requested conference (by websafeConferenceKey)."""
+        # answer from version stamps alone if the client is up to date;
+        # organizer displayName is part of the form, so stamp it too
+        c_key = ndb.Key(urlsafe=request.websafeConferenceKey)
+        etag = self._checkEtag('conference:%s' % c_key.urlsafe(),
+                               'profile:%s' % c_key.parent().id())
         # get Conference object from request; bail if not found
-        conf = ndb.Key(urlsafe=request.websafeConferenceKey).get()
+        conf = c_key.get()
         if not conf:
             raise endpoints.NotFoundException(
                 'No conference found with key: %s' % request.websafeConferenceKey)
         prof = conf.key.parent().get()
         # return ConferenceForm
-        return self._copyConferenceToForm(conf, getattr(prof, 'displayName'))
+        cf = self._copyConferenceToForm(conf, getattr(prof, 'displayName'))
+        cf.etag = etag
+        return cf
 
     @endpoints.method(message_types.VoidMessage, ConferenceForms,
                       path='getConferencesCreated',
@@ -286,11 +638,37 @@ class ConferenceApi(remote.Service):
             items=[self._copyConferenceToForm(conf, getattr(prof, 'displayName')) for conf in confs]
         )
 
+    @endpoints.method(message_types.VoidMessage, ConferenceSummaryForms,
+                      path='getConferenceSummariesCreated',
+                      http_method='POST', name='getConferenceSummariesCreated')
+    def getConferenceSummariesCreated(self, request):
+        """Return summaries of conferences created by user."""
+        # make sure user is authed
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        user_id = getUserId(user)
+
+        # projected ancestor query; no organizer profile lookup needed
+        confs = Conference.query(ancestor=ndb.Key(Profile, user_id)).fetch(
+            projection=SUMMARY_FIELDS)
+        return ConferenceSummaryForms(
+            items=[self._copySummaryToForm(conf, ConferenceSummaryForm())
+                   for conf in confs]
+        )
+
     def _getQuery(self, request):
-        """Return formatted query from the submitted filters."""
+        """Return formatted query from the submitted filters, along
+        with the topic ids its results must be joined against & the
+        other filters it was built from."""
         q = Conference.query()
         inequality_filter, filters = self._formatFilters(request.filters)
 
+        # topics aren't indexed on Conference; pull them out for the join
+        topic_ids = [normalizeTopic(f["value"]) for f in filters
+                     if f["field"] == "topics"]
+        filters = [f for f in filters if f["field"] != "topics"]
+
         # If exists, sort on inequality filter first
         if not inequality_filter:
             q = q.order(Conference.name)
@@ -303,7 +681,7 @@ class ConferenceApi(remote.Service):
                 filtr["value"] = int(filtr["value"])
             formatted_query = ndb.query.FilterNode(filtr["field"], filtr["operator"], filtr["value"])
             q = q.filter(formatted_query)
-        return q
+        return q, topic_ids, filters
 
     def _formatFilters(self, filters):
         """Parse, check validity and format user supplied filters."""
@@ -322,6 +700,9 @@ class ConferenceApi(remote.Service):
                 raise endpoints.BadRequestException(
                     "Filter contains invalid field or operator."
                     )
+            if filtr["field"] == "topics" and filtr["operator"] != "=":
+                raise endpoints.BadRequestException(
+                    "Topic filters only support the EQ operator.")
 
             # Every operation except "=" is an inequality
             if filtr["operator"] != "=":
@@ -342,25 +723,320 @@ class ConferenceApi(remote.Service):
                       name='queryConferences')
     def queryConferences(self, request):
         """Query for conferences."""
-        conferences = self._getQuery(request)
-
-        # need to fetch organiser displayName from profiles
-        # get all keys and use get_multi for speed
-        organisers = [(ndb.Key(Profile, conf.organizerUserId)) for conf in conferences]
-        profiles = ndb.get_multi(organisers)
-
-        # put display names in a dict for easier fetching
-        names = {}
-        for profile in profiles:
-            names[profile.key.id()] = profile.displayName
+        q, topic_ids, filters = self._getQuery(request)
+        conferences = self._fetchWithTopics(q, topic_ids, filters)
 
         # return individual ConferenceForm object per Conference
-        return ConferenceForms(
-                items=[self._copyConferenceToForm(
-                    conf, names[conf.organizerUserId]) for conf in conferences]
+        return self._copyConferencesToForms(conferences)
+
+    @endpoints.method(ConferenceQueryForms, ConferenceSummaryForms,
+                      path='queryConferenceSummaries',
+                      http_method='POST',
+                      name='queryConferenceSummaries')
+    def queryConferenceSummaries(self, request):
+        """Query for conferences, returning compact summaries."""
+        q, topic_ids, filters = self._getQuery(request)
+
+        # properties under an equality filter can't be projected; every
+        # result shares the filter value, so fill them in from there
+        fixed = {}
+        for filtr in self._formatFilters(request.filters)[1]:
+            if filtr["operator"] == "=":
+                fixed[filtr["field"]] = filtr["value"]
+        projection = [f for f in SUMMARY_FIELDS if f not in fixed]
+        conferences = self._fetchWithTopics(q, topic_ids, filters, projection)
+
+        return ConferenceSummaryForms(
+            items=[self._copySummaryToForm(conf, ConferenceSummaryForm(), fixed)
+                   for conf in conferences]
         )
 
 
+# - - - Topics - - - - - - - - - - - - - - - - - - - - - - -
+
+    @staticmethod
+    @ndb.non_transactional
+    def _resolveTopics(names):
+        """Return (canonical names, ids) of topics, adding new ones to
+        the topic dictionary."""
+        ids = []
+        for name in names:
+            tid = normalizeTopic(name)
+            if tid and tid not in ids:
+                ids.append(tid)
+        entries = ndb.get_multi([ndb.Key(Topic, tid) for tid in ids])
+        new = []
+        for i, tid in enumerate(ids):
+            if not entries[i]:
+                # first spelling seen becomes the canonical one
+                name = [n for n in names if normalizeTopic(n) == tid][0]
+                entries[i] = Topic(id=tid, name=name.strip())
+                new.append(entries[i])
+        ndb.put_multi(new)
+        return [entry.name for entry in entries], ids
+
+    @staticmethod
+    def _syncTopicMemberships(conf, old_ids):
+        """Bring topic index rows of conf in line with its topicIds."""
+        ndb.delete_multi([ndb.Key(TopicMembership, tid, parent=conf.key)
+                          for tid in old_ids if tid not in conf.topicIds])
+        ndb.put_multi([TopicMembership(id=tid, parent=conf.key, topicId=tid)
+                       for tid in conf.topicIds if tid not in old_ids])
+
+    @staticmethod
+    def _topicMembers(topic_ids, limit=TOPIC_JOIN_LIMIT):
+        """Return set of Conference keys tagged with all topic ids, or
+        None if every one of the topics tags more than limit of them."""
+        topic_ids = list(set(topic_ids))
+        futures = [TopicMembership.query(TopicMembership.topicId == tid)
+                   .fetch_async(limit + 1, keys_only=True) for tid in topic_ids]
+        tagged = dict((tid, set(key.parent() for key in future.get_result()))
+                      for tid, future in zip(topic_ids, futures))
+        complete = [tid for tid in topic_ids if len(tagged[tid]) <= limit]
+        if not complete:
+            return None
+        members = set.intersection(*[tagged[tid] for tid in complete])
+        # topics too big to load are checked conference by conference
+        return set(ConferenceApi._filterTagged(
+            members, [tid for tid in topic_ids if tid not in complete]))
+
+    @staticmethod
+    def _filterTagged(conf_keys, topic_ids):
+        """Return those of conf_keys tagged with all topic ids, looking
+        their topic index rows up by key."""
+        conf_keys = list(conf_keys)
+        if not topic_ids or not conf_keys:
+            return conf_keys
+        rows = ndb.get_multi([ndb.Key(TopicMembership, tid, parent=key)
+                              for key in conf_keys for tid in topic_ids])
+        n = len(topic_ids)
+        return [key for i, key in enumerate(conf_keys)
+                if all(rows[i * n:(i + 1) * n])]
+
+    @staticmethod
+    def _matchesFilters(conf, filters):
+        """Return True if conf passes all formatted filters; like the
+        datastore, a missing value never passes."""
+        for filtr in filters:
+            value = getattr(conf, filtr["field"])
+            if value is None or \
+                    not FILTER_TESTS[filtr["operator"]](value, filtr["value"]):
+                return False
+        return True
+
+    def _fetchWithTopics(self, q, topic_ids, filters=(), projection=None):
+        """Run Conference query q, built from filters, keeping only
+        results tagged with all topic ids; order of q is preserved."""
+        if not topic_ids:
+            return q.fetch(projection=projection)
+        members = self._topicMembers(topic_ids)
+        if members is not None:
+            # few enough tagged conferences: load them by key and filter
+            # & order them like q would, rather than scanning q
+            inequality = [f["field"] for f in filters if f["operator"] != "="]
+            confs = [conf for conf in ndb.get_multi(list(members))
+                     if conf and self._matchesFilters(conf, filters)]
+            confs.sort(key=lambda conf: (
+                getattr(conf, inequality[0]) if inequality else None,
+                conf.name))
+            return confs
+        # every topic is common, so tagged results are too: scan q a
+        # batch at a time & stop once the limit is reached
+        results = []
+        confs = q.iter(projection=projection, batch_size=TOPIC_JOIN_BATCH)
+        while len(results) < TOPIC_JOIN_LIMIT:
+            batch = list(itertools.islice(confs, TOPIC_JOIN_BATCH))
+            if not batch:
+                break
+            tagged = set(self._filterTagged([conf.key for conf in batch],
+                                            topic_ids))
+            results.extend(conf for conf in batch if conf.key in tagged)
+        return results[:TOPIC_JOIN_LIMIT]
+
+    @staticmethod
+    def _reindexTopics(confs):
+        """Move a batch of conferences onto the topic dictionary;
+        mapper function of the 'topics' mapper."""
+        for conf in confs:
+            conf.topics, conf.topicIds = ConferenceApi._resolveTopics(
+                conf.topics)
+            ConferenceApi._syncTopicMemberships(conf, [])
+        # rewriting drops the old per-topic composite index rows
+        return confs
+
+# - - - Facets - - - - - - - - - - - - - - - - - - - - - - -
+
+    @staticmethod
+    def _facetValues(conf):
+        """Return {facet counter id: (count, available)} for a Conference."""
+        available = 1 if conf.seatsAvailable > 0 else 0
+        values = ([('city', conf.city)] +
+                  [('topic', topic) for topic in set(conf.topics)] +
+                  [('month', conf.month)])
+        return dict(('%s:%s' % (facet, value), (1, available))
+                    for facet, value in values if value)
+
+    @staticmethod
+    def _queueFacetDeltas(before, after):
+        """Queue counter changes for a Conference going from before to after.
+
+        Changes go to a pull queue that a coalesced job drains and sums
+        once per window, so hot values never add entity groups to the
+        registration transaction; when called inside a transaction, the
+        change is only queued if it commits.
+        """
+        deltas = {}
+        for fid in set(before) | set(after):
+            old = before.get(fid, (0, 0))
+            new = after.get(fid, (0, 0))
+            if old != new:
+                deltas[fid] = [new[0] - old[0], new[1] - old[1]]
+        if deltas:
+            taskqueue.Queue(FACET_DELTAS_QUEUE).add(
+                taskqueue.Task(payload=json.dumps(deltas), method='PULL'),
+                transactional=ndb.in_transaction())
+            coalescing.schedule('facets')
+
+    @staticmethod
+    def _drainFacetDeltas():
+        """Coalesced job: apply queued facet changes, unless the facets
+        are being rebuilt, in which case try again next window."""
+        if not memcache.add(MEMCACHE_FACETS_LOCK_KEY, 1, time=FACETS_LOCK_TTL):
+            coalescing.schedule('facets', delay=coalescing.WINDOW)
+            return
+        try:
+            ConferenceApi._applyQueuedFacetDeltas()
+        finally:
+            memcache.delete(MEMCACHE_FACETS_LOCK_KEY)
+
+    @staticmethod
+    def _applyQueuedFacetDeltas():
+        """Sum all queued facet changes and apply them in one go.
+
+        Each sum is stored as a FacetDeltaBatch before its pull tasks
+        are deleted, & only dropped once they are; a drain that dies
+        midway leaves its batch to be finished by the next drain rather
+        than letting its tasks be leased & summed again.
+        """
+        queue = taskqueue.Queue(FACET_DELTAS_QUEUE)
+        for batch in FacetDeltaBatch.query():
+            ConferenceApi._finishFacetDeltaBatch(queue, batch)
+        while True:
+            tasks = queue.lease_tasks(60, FACET_DELTAS_LEASE)
+            if not tasks:
+                return
+            deltas = {}
+            for task in tasks:
+                for fid, (count, available) in json.loads(task.payload).items():
+                    total = deltas.setdefault(fid, [0, 0])
+                    total[0] += count
+                    total[1] += available
+            batch = FacetDeltaBatch(
+                deltas=dict((fid, d) for fid, d in deltas.items() if d != [0, 0]),
+                tasks=[task.name for task in tasks])
+            batch.put()
+            ConferenceApi._finishFacetDeltaBatch(queue, batch)
+
+    @staticmethod
+    def _finishFacetDeltaBatch(queue, batch):
+        """Apply a stored delta batch, delete its tasks, then the batch."""
+        ConferenceApi._applyFacetDeltas(batch.deltas,
+                                        'batch:%s' % batch.key.id())
+        queue.delete_tasks_by_name(batch.tasks)
+        batch.key.delete()
+
+    @staticmethod
+    def _applyFacetDeltas(deltas, deltasId):
+        """Add {facet counter id: [count, available]} deltas to counters.
+
+        Counters remember deltasId, so applying the same deltas again,
+        as a retry after some of the transactions below committed does,
+        skips the counters they were already added to.
+        """
+        @ndb.transactional(xg=True)
+        def apply(fids):
+            counters = ndb.get_multi([ndb.Key(FacetCount, fid) for fid in fids])
+            for i, fid in enumerate(fids):
+                if not counters[i]:
+                    facet, value = fid.split(':', 1)
+                    counters[i] = FacetCount(id=fid, facet=facet, value=value)
+                if deltasId in counters[i].applied:
+                    continue
+                counters[i].count += deltas[fid][0]
+                counters[i].available += deltas[fid][1]
+                counters[i].applied = (counters[i].applied +
+                                       [deltasId])[-FACET_APPLIED_IDS:]
+            ndb.put_multi(counters)
+
+        fids = sorted(deltas)
+        # keep each transaction well inside the cross-group limit
+        for i in range(0, len(fids), FACET_TXN_GROUPS):
+            apply(fids[i:i + FACET_TXN_GROUPS])
+
+    @staticmethod
+    def _rebuildFacets():
+        """Recount all facet counters from scratch to repair drift;
+        return False if the counters are busy, for the cron to retry.
+
+        Queued changes are applied first, as the scan reflects them;
+        ones queued while it runs can still be counted twice, until
+        the next rebuild.
+        """
+        if not memcache.add(MEMCACHE_FACETS_LOCK_KEY, 1, time=FACETS_LOCK_TTL):
+            return False
+        try:
+            ConferenceApi._applyQueuedFacetDeltas()
+            ConferenceApi._recountFacets()
+        finally:
+            memcache.delete(MEMCACHE_FACETS_LOCK_KEY)
+        return True
+
+    @staticmethod
+    def _recountFacets():
+        """Overwrite facet counters with counts from a scan of every
+        Conference, keeping the delta batch ids they remember."""
+        totals = {}
+        for conf in Conference.query().iter(batch_size=200):
+            for fid, (count, available) in \
+                    ConferenceApi._facetValues(conf).items():
+                total = totals.setdefault(fid, [0, 0])
+                total[0] += count
+                total[1] += available
+
+        @ndb.transactional(xg=True)
+        def store(fids):
+            counters = ndb.get_multi([ndb.Key(FacetCount, fid) for fid in fids])
+            for i, fid in enumerate(fids):
+                if not counters[i]:
+                    facet, value = fid.split(':', 1)
+                    counters[i] = FacetCount(id=fid, facet=facet, value=value)
+                counters[i].count, counters[i].available = totals[fid]
+            ndb.put_multi(counters)
+
+        fids = sorted(totals)
+        for i in range(0, len(fids), FACET_TXN_GROUPS):
+            store(fids[i:i + FACET_TXN_GROUPS])
+        ndb.delete_multi([key for key in FacetCount.query().iter(keys_only=True)
+                          if key.id() not in totals])
+
+    @endpoints.method(message_types.VoidMessage, ConferenceFacetsForm,
+                      path='conferences/facets',
+                      http_method='GET', name='getConferenceFacets')
+    def getConferenceFacets(self, request):
+        """Return conference counts per city, topic & month."""
+        values = dict((facet, []) for facet in FACETS)
+        for counter in FacetCount.query():
+            if counter.count > 0 and counter.facet in values:
+                values[counter.facet].append(FacetValueForm(
+                    value=counter.value, count=counter.count,
+                    available=counter.available))
+        for forms in values.values():
+            forms.sort(key=lambda form: (-form.count, form.value))
+        return ConferenceFacetsForm(cities=values['city'],
+                                    topics=values['topic'],
+                                    months=values['month'])
+
+
 # - - - Profile objects - - - - - - - - - - - - - - - - - - -
 
     def _copyProfileToForm(self, prof):
@@ -417,6 +1093,7 @@ class ConferenceApi(remote.Service):
                         #  else:
                         #  setattr(prof, field, val)
                         prof.put()
+                        self._bumpVersions('profile:%s' % prof.key.id())
 
         # return ProfileForm
         return self._copyProfileToForm(prof)
@@ -425,7 +1102,13 @@ class ConferenceApi(remote.Service):
                       path='profile', http_method='GET', name='getProfile')
     def getProfile(self, request):
         """Return user profile."""
-        return self._doProfile()
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        etag = self._checkEtag('profile:%s' % getUserId(user))
+        pf = self._doProfile()
+        pf.etag = etag
+        return pf
 
     @endpoints.method(ProfileMiniForm, ProfileForm,
                       path='profile', http_method='POST', name='saveProfile')
@@ -433,16 +1116,361 @@ class ConferenceApi(remote.Service):
         """Update & return user profile."""
         return self._doProfile(request)
 
+# - - - Dashboard - - - - - - - - - - - - - - - - - - - - -
+
+    @staticmethod
+    def _copyConferenceToStats(conf, stats):
+        """Copy the fields the dashboard shows from conf to stats."""
+        stats.name = conf.name
+        stats.startDate = conf.startDate
+        stats.maxAttendees = conf.maxAttendees
+        stats.seatsAvailable = conf.seatsAvailable
+
+    @staticmethod
+    def _updateStats(conf, registrations=0):
+        """Bring the rollup of conf up to date & count registrations;
+        call in the transaction writing conf, which shares its group."""
+        key = ndb.Key(ConferenceStats, STATS_ID, parent=conf.key)
+        stats = key.get() or ConferenceStats(key=key)
+        ConferenceApi._copyConferenceToStats(conf, stats)
+        stats.registrations = max(0, stats.registrations + registrations)
+        stats.put()
+
+    @staticmethod
+    def _sessionConferenceKey(sess_key):
+        """Return the key of the Conference sess_key belongs to."""
+        parent = sess_key.parent()
+        # sessions from before compact keys are parented on a key named
+        # after the websafe key of their conference, not on the conference
+        if parent.string_id():
+            return ndb.Key(urlsafe=parent.string_id())
+        return parent
+
+    @staticmethod
+    def _conferenceSessions(conf_key, *filters):
+        """Return the sessions of a conference, including those still
+        under its pseudo-conference parent from before compact keys."""
+        futures = [Session.query(*filters, ancestor=parent).fetch_async()
+                   for parent in (conf_key,
+                                  ndb.Key(Conference, conf_key.urlsafe()))]
+        return [sess for future in futures for sess in future.get_result()]
+
+    @staticmethod
+    def _markStats(sess_key, sign):
+        """Queue a wishlist count change of a session for its conference
+        rollup, once the current transaction commits."""
+        coalescing.markDirtyOnCommit(
+            'conference_stats',
+            ConferenceApi._sessionConferenceKey(sess_key).urlsafe(),
+            ['wishlist', sessionClientId(sess_key), sign])
+
+    @staticmethod
+    def _applyStatsChanges(marks):
+        """Coalesced job: fold new sessions & wishlist changes into the
+        rollups of marked conferences; marks come with their ids."""
+        for wsck, changes in marks:
+            ConferenceApi._changeStats(ndb.Key(urlsafe=wsck), changes)
+
+    @staticmethod
+    @ndb.transactional()
+    def _changeStats(conf_key, changes=(), featuredSpeaker=None):
+        """Apply (mark id, change) pairs of ['session', session key,
+        name], ['wishlist', session key, +1/-1] & ['deleted', session
+        key, None] changes and/or a new featured speaker ('' for none)
+        to a rollup. Changes whose mark it already applied are skipped,
+        so a retried batch doesn't count them twice."""
+        key = ndb.Key(ConferenceStats, STATS_ID, parent=conf_key)
+        stats = key.get()
+        if not stats:
+            conf = conf_key.get()
+            if not conf:
+                return
+            stats = ConferenceStats(key=key)
+            ConferenceApi._copyConferenceToStats(conf, stats)
+        sessions = dict(stats.sessions or {})
+        applied = list(stats.applied)
+        for markId, (change, wssk, value) in changes:
+            if markId in applied:
+                continue
+            applied.append(markId)
+            if change == 'deleted':
+                sessions.pop(wssk, None)
+                continue
+            entry = sessions.setdefault(wssk, {'name': None, 'wishlists': 0})
+            if change == 'session':
+                entry['name'] = value
+            else:
+                entry['wishlists'] = max(0, entry['wishlists'] + value)
+        stats.sessions = sessions
+        stats.applied = applied[-STATS_APPLIED_IDS:]
+        if featuredSpeaker is not None:
+            stats.featuredSpeaker = featuredSpeaker or None
+        stats.put()
+
+    @staticmethod
+    def _rebuildStats(conf):
+        """Recount the rollup of conf from scratch; mapper function of
+        the 'conference_stats' mapper."""
+        sessions = ConferenceApi._conferenceSessions(conf.key)
+        wishlists = ConferenceApi._wishlistCounts([sess.key for sess in sessions])
+        fs = ndb.Key(FeaturedSpeaker, FEATURED_SPEAKER_ID, parent=conf.key).get()
+        old = ndb.Key(ConferenceStats, STATS_ID, parent=conf.key).get()
+        stats = ConferenceStats(
+            id=STATS_ID, parent=conf.key,
+            applied=old.applied if old else [],
+            registrations=ConferenceApi._registrationCount(conf.key),
+            sessions=dict((sessionClientId(sess.key),
+                           {'name': sess.name, 'wishlists': count})
+                          for sess, count in zip(sessions, wishlists)),
+            featuredSpeaker=fs.speaker if fs else None)
+        ConferenceApi._copyConferenceToStats(conf, stats)
+        stats.put()
+
+    @staticmethod
+    @ndb.non_transactional
+    def _registrationCount(conf_key):
+        """Return how many profiles are registered for conf_key."""
+        return Profile.query(
+            Profile.conferenceKeysToAttend == conf_key.urlsafe()).count()
+
+    @staticmethod
+    def _copyStatsToForm(stats):
+        """Copy a ConferenceStats rollup to ConferenceStatsForm."""
+        sessions = sorted((stats.sessions or {}).items(),
+                          key=lambda item: -item[1]['wishlists'])
+        return ConferenceStatsForm(
+            websafeConferenceKey=stats.key.parent().urlsafe(),
+            name=stats.name,
+            startDate=str(stats.startDate) if stats.startDate else None,
+            maxAttendees=stats.maxAttendees,
+            seatsAvailable=stats.seatsAvailable,
+            registrations=stats.registrations,
+            fillRate=(float(stats.registrations) / stats.maxAttendees
+                      if stats.maxAttendees else None),
+            sessionCount=len(sessions),
+            sessions=[SessionStatsForm(websafeKey=wssk, name=entry['name'],
+                                       wishlists=entry['wishlists'])
+                      for wssk, entry in sessions],
+            featuredSpeaker=stats.featuredSpeaker)
+
+    @endpoints.method(message_types.VoidMessage, ConferenceStatsForms,
+                      path='dashboard',
+                      http_method='GET', name='getOrganizerDashboard')
+    def getOrganizerDashboard(self, request):
+        """Return registration, session & wishlist rollups of every
+        conference the user created."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        # rollups live under the conferences, which live under the
+        # organizer's profile
+        rollups = ConferenceStats.query(
+            ancestor=ndb.Key(Profile, getUserId(user))).fetch()
+        rollups.sort(key=lambda stats: (stats.startDate is None,
+                                        stats.startDate, stats.name))
+        return ConferenceStatsForms(
+            items=[self._copyStatsToForm(stats) for stats in rollups])
+
+# - - - Agenda - - - - - - - - - - - - - - - - - - - - - - -
+
+    @staticmethod
+    def _agendaItem(entity):
+        """Return the agenda item of a Conference or Session."""
+        return {
+            'kind': entity.key.kind(),
+            'websafeKey': ConferenceApi._clientKey(entity.key),
+            'name': entity.name,
+            'city': entity.city,
+            'startDate': str(entity.startDate) if entity.startDate else None,
+            'endDate': str(entity.endDate) if entity.endDate else None,
+        }
+
+    @staticmethod
+    def _sortAgenda(items):
+        """Sort agenda items by date & list, for every item, the items
+        of the same kind whose dates overlap it; undated items go last.
+
+        Sessions carry dates but no times, so sessions on the same day
+        count as overlapping.
+        """
+        items.sort(key=lambda item: (item['startDate'] is None,
+                                     item['startDate'], item['name']))
+        for item in items:
+            item['overlapsWith'] = []
+        for i, item in enumerate(items):
+            if not item['startDate']:
+                break
+            end = item['endDate'] or item['startDate']
+            for other in items[i + 1:]:
+                if not other['startDate'] or other['startDate'] > end:
+                    break
+                if other['kind'] == item['kind']:
+                    item['overlapsWith'].append(other['websafeKey'])
+                    other['overlapsWith'].append(item['websafeKey'])
+        return items
+
+    @staticmethod
+    def _changeAgenda(agenda, add=None, remove=None):
+        """Put the item of entity add on agenda and/or take the item
+        with websafe key remove off it."""
+        drop = set([remove, ConferenceApi._clientKey(add.key) if add else None])
+        items = [item for item in agenda.items or []
+                 if item['websafeKey'] not in drop]
+        if add:
+            items.append(ConferenceApi._agendaItem(add))
+        agenda.items = ConferenceApi._sortAgenda(items)
+
+    @staticmethod
+    def _updateAgenda(prof, add=None, remove=None):
+        """Apply a registration or wishlist change to the agenda of prof;
+        call in the transaction making the change. Agendas not built yet
+        are left alone; they are built from the profile when first read."""
+        agenda = ndb.Key(Agenda, AGENDA_ID, parent=prof.key).get()
+        if agenda:
+            ConferenceApi._changeAgenda(agenda, add, remove)
+            agenda.put()
+
+    @staticmethod
+    @ndb.transactional()
+    def _storeAgenda(agenda, prof):
+        """Store agenda built from prof unless one was stored meanwhile;
+        return the stored agenda, or None if prof changed since."""
+        stored = agenda.key.get()
+        if stored:
+            return stored
+        current = prof.key.get()
+        if (current.conferenceKeysToAttend != prof.conferenceKeysToAttend or
+                current.wishList != prof.wishList):
+            return None
+        agenda.put()
+        return agenda
+
+    @staticmethod
+    def _getAgenda(prof):
+        """Return the Agenda of prof, building it first if needed."""
+        agenda = ndb.Key(Agenda, AGENDA_ID, parent=prof.key).get()
+        for _ in range(AGENDA_BUILD_ATTEMPTS):
+            if agenda:
+                return agenda
+            keys = ([ndb.Key(urlsafe=wsck)
+                     for wsck in prof.conferenceKeysToAttend] +
+                    [sessionKey(wssk) for wssk in prof.wishList])
+            items = [ConferenceApi._agendaItem(entity)
+                     for entity in ndb.get_multi(keys) if entity]
+            agenda = ConferenceApi._storeAgenda(
+                Agenda(id=AGENDA_ID, parent=prof.key,
+                       items=ConferenceApi._sortAgenda(items)), prof)
+            if not agenda:
+                # registered or wishlisted meanwhile; start over
+                prof = prof.key.get()
+        if not agenda:
+            raise ServiceUnavailableException(
+                'Agenda is changing too fast; try again.')
+        return agenda
+
+    @staticmethod
+    def _refreshAgendas(marks):
+        """Refresh the items of changed conferences on the agendas of
+        everyone attending them.
+
+        At most AGENDA_REFRESH_BATCH agendas are refreshed per batch; a
+        conference with attendees left is marked again with the cursor
+        to go on from. A change marked meanwhile starts it over, as the
+        attendees already done have the old version.
+        """
+        remaining = AGENDA_REFRESH_BATCH
+        for wsck, items in marks:
+            cursors = [item['cursor'] for item in items]
+            start = None if None in cursors else cursors[-1]
+            conf = ndb.Key(urlsafe=wsck).get()
+            if not conf:
+                continue
+            if not remaining:
+                coalescing.markDirty('agendas', wsck, {'cursor': start})
+                continue
+            attendees, cursor, more = Profile.query(
+                Profile.conferenceKeysToAttend == wsck).fetch_page(
+                    remaining, keys_only=True,
+                    start_cursor=ndb.Cursor(urlsafe=start) if start else None)
+            for prof_key in attendees:
+                ConferenceApi._refreshAgendaItem(prof_key, conf)
+            remaining -= len(attendees)
+            if more and cursor:
+                coalescing.markDirty('agendas', wsck,
+                                     {'cursor': cursor.urlsafe()})
+
+    @staticmethod
+    @ndb.transactional()
+    def _refreshAgendaItem(prof_key, entity):
+        """Replace the item of entity on the agenda of prof_key, if any."""
+        agenda = ndb.Key(Agenda, AGENDA_ID, parent=prof_key).get()
+        wsk = ConferenceApi._clientKey(entity.key)
+        if agenda and any(item['websafeKey'] == wsk
+                          for item in agenda.items or []):
+            ConferenceApi._changeAgenda(agenda, add=entity)
+            agenda.put()
+
+    @endpoints.method(message_types.VoidMessage, AgendaForm,
+                      path='agenda', http_method='GET', name='getAgenda')
+    def getAgenda(self, request):
+        """Return registered conferences & wishlisted sessions of the
+        user in date order, flagging the ones whose dates overlap."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        # the agenda alone answers; the profile is only read to build it
+        agenda = ndb.Key(Profile, getUserId(user), Agenda, AGENDA_ID).get()
+        if not agenda:
+            agenda = self._getAgenda(self._getProfileFromUser())
+        return AgendaForm(items=[
+            AgendaItemForm(overlaps=bool(item['overlapsWith']), **item)
+            for item in agenda.items or []])
+
+
+# - - - Warmup - - - - - - - - - - - - - - - - - - - - - - -
+
+    @staticmethod
+    def _warmUp():
+        """Prime per-instance & shared caches with hot data; return
+        number of conferences primed."""
+        ANNOUNCEMENT_CACHE.get()
+        FEATURED_SPEAKER_CACHE.get()
+
+        # the conferences on the pages everyone lands on: the first of
+        # the unfiltered listing & of the upcoming timeline; ndb leaves
+        # them & their organizers in memcache on the way
+        futures = [
+            Conference.query().order(Conference.name).fetch_async(
+                WARMUP_CONFERENCES, keys_only=True),
+            Conference.query(
+                Conference.startDate >= datetime.utcnow().date()).order(
+                Conference.startDate).fetch_async(
+                min(WARMUP_CONFERENCES, TIMELINE_PAGE_SIZE), keys_only=True)]
+        keys = list(set(key for future in futures
+                        for key in future.get_result()))
+        confs = [conf for conf in ndb.get_multi(keys) if conf]
+        ndb.get_multi([ndb.Key(Profile, conf.organizerUserId) for conf in confs])
+        ConferenceApi._getFeaturedSpeakers(keys)
+        return len(confs)
 
 # - - - Announcements - - - - - - - - - - - - - - - - - - - -
 
+    @staticmethod
+    def _seatsChanged(before, after):
+        """Schedule announcement recompute if seats crossed into or out
+        of the nearly-sold-out range."""
+        def nearlySoldOut(seats):
+            return 0 < seats <= ANNOUNCEMENT_SEATS
+        if nearlySoldOut(before) != nearlySoldOut(after):
+            coalescing.schedule('announcement')
+
     @staticmethod
     def _cacheAnnouncement():
-        """Create Announcement & assign to memcache; used by
-        memcache cron job & putAnnouncement().
+        """Create Announcement & assign to the announcement cache; used
+        by memcache cron job, cache refresh task & putAnnouncement().
         """
         confs = Conference.query(ndb.AND(
-            Conference.seatsAvailable <= 5,
+            Conference.seatsAvailable <= ANNOUNCEMENT_SEATS,
             Conference.seatsAvailable > 0)
         ).fetch(projection=[Conference.name])
 
@@ -451,30 +1479,101 @@ class ConferenceApi(remote.Service):
             # format announcement and set it in memcache
             announcement = ANNOUNCEMENT_TPL % (
                 ', '.join(conf.name for conf in confs))
-            memcache.set(MEMCACHE_ANNOUNCEMENTS_KEY, announcement)
         else:
             # If there are no sold out conferences,
-            # delete the memcache announcements entry
+            # clear the announcement
             announcement = ""
-            memcache.delete(MEMCACHE_ANNOUNCEMENTS_KEY)
 
+        ANNOUNCEMENT_CACHE.set(announcement)
         return announcement
 
     @endpoints.method(message_types.VoidMessage, StringMessage,
                       path='conference/announcement/get',
                       http_method='GET', name='getAnnouncement')
     def getAnnouncement(self, request):
-        """Return Announcement from memcache."""
-        return StringMessage(data=memcache.get(MEMCACHE_ANNOUNCEMENTS_KEY) or "")
+        """Return Announcement from the announcement cache."""
+        return self._cachedStringMessage(ANNOUNCEMENT_CACHE)
+
+    def _cachedStringMessage(self, cache):
+        """Return StringMessage for a tiered cache value, tagged with
+        the time it was built."""
+        value, stamp = cache.get()
+        etag = '"%d"' % int(stamp * 1000)
+        if etag in self._ifNoneMatch():
+            raise NotModifiedException()
+        return StringMessage(data=value or "", etag=etag)
 
 
 # - - - Registration - - - - - - - - - - - - - - - - - - - -
 
-    @ndb.transactional(xg=True)
+    def _admit(self, operation, conf_key):
+        """Refuse the request early if writes to the conference, or to
+        the entity group it shares with every conference & session of
+        its organizer, are over budget."""
+        wait = (admit(operation, conf_key.urlsafe()) or
+                admit('entityGroup', conf_key.root().urlsafe()))
+        if wait:
+            raise ServiceUnavailableException(
+                'Too many requests for this conference; '
+                'retry after %d seconds.' % max(1, int(round(wait))))
+
+    def _transact(self, func, *args, **kwargs):
+        """Run func in an xg transaction with jittered retries."""
+        try:
+            return runInTransaction(func, *args, xg=True, **kwargs)
+        except datastore_errors.TransactionFailedError:
+            raise ServiceUnavailableException(
+                'This conference is busy; retry after 1 seconds.')
+
+    def _replayedOutcome(self, operation, target, requestId, user_id=None):
+        """Return BooleanMessage recorded for a client request ID, if any."""
+        if not requestId:
+            return None
+        if len(requestId) > 100 or requestId.startswith('__'):
+            raise endpoints.BadRequestException("Invalid 'requestId'.")
+        if user_id is None:
+            user = endpoints.get_current_user()
+            if not user:
+                raise endpoints.UnauthorizedException('Authorization required')
+            user_id = getUserId(user)
+        record = ndb.Key(Profile, user_id, RequestOutcome, requestId).get()
+        if not record:
+            return None
+        if (record.operation, record.target) != (operation, target):
+            raise endpoints.BadRequestException(
+                "requestId was already used for a different request.")
+        return BooleanMessage(data=record.outcome)
+
+    def _recordOutcome(self, prof, operation, target, requestId, outcome):
+        """Remember outcome of a client request ID; call in the same
+        transaction as the write so that both commit or neither does."""
+        if requestId:
+            RequestOutcome(id=requestId, parent=prof.key, operation=operation,
+                           target=target, outcome=outcome).put()
+        return BooleanMessage(data=outcome)
+
+    @staticmethod
+    def _expireRequestOutcomes():
+        """Delete request ID records too old to be replayed."""
+        cutoff = datetime.now() - REQUEST_OUTCOME_TTL
+        q = RequestOutcome.query(RequestOutcome.created < cutoff)
+        while True:
+            keys = q.fetch(500, keys_only=True)
+            if not keys:
+                break
+            ndb.delete_multi(keys)
+
     def _conferenceRegistration(self, request, reg=True):
-        """Register or unregister user for selected conference."""
+        """Register or unregister user for selected conference; run
+        in an xg transaction."""
         retval = None
         prof = self._getProfileFromUser()  # get user Profile
+        operation = 'registerForConference' if reg else 'unregisterFromConference'
+        # a concurrent replay of the same request may have won the race
+        replay = self._replayedOutcome(operation, request.websafeConferenceKey,
+                                       request.requestId, prof.key.id())
+        if replay is not None:
+            return replay
 
         #  check if conf exists given websafeConfKey
         #  get conference; check that it exists
@@ -483,6 +1582,8 @@ class ConferenceApi(remote.Service):
         if not conf:
             raise endpoints.NotFoundException(
                 'No conference found with key: %s' % wsck)
+        facets = self._facetValues(conf)
+        seats = conf.seatsAvailable
 
         # register
         if reg:
@@ -494,11 +1595,15 @@ class ConferenceApi(remote.Service):
             # check if seats avail
             if conf.seatsAvailable <= 0:
                 raise ConflictException(
-                    "There are no seats available.")
+                    "There are no seats available. Join the waitlist "
+                    "to be registered as soon as one frees up.")
 
             # register user, take away one seat
             prof.conferenceKeysToAttend.append(wsck)
             conf.seatsAvailable -= 1
+            # no longer waiting, if they were
+            ndb.Key(WaitlistEntry, prof.key.id(), parent=conf.key).delete()
+            self._updateAgenda(prof, add=conf)
             retval = True
 
         # unregister
@@ -509,6 +1614,8 @@ class ConferenceApi(remote.Service):
                 # unregister user, add back one seat
                 prof.conferenceKeysToAttend.remove(wsck)
                 conf.seatsAvailable += 1
+                self._queueWaitlistPromotion(conf)
+                self._updateAgenda(prof, remove=wsck)
                 retval = True
             else:
                 retval = False
@@ -516,7 +1623,119 @@ class ConferenceApi(remote.Service):
         # write things back to the datastore & return
         prof.put()
         conf.put()
-        return BooleanMessage(data=retval)
+        if retval:
+            self._updateStats(conf, 1 if reg else -1)
+        self._queueFacetDeltas(facets, self._facetValues(conf))
+        self._seatsChanged(seats, conf.seatsAvailable)
+        self._bumpVersions('conference:%s' % conf.key.urlsafe(),
+                           'profile:%s' % prof.key.id())
+        return self._recordOutcome(prof, operation, wsck,
+                                   request.requestId, retval)
+
+    @endpoints.method(CONF_GET_REQUEST, BooleanMessage,
+                      path='conference/{websafeConferenceKey}/waitlist',
+                      http_method='POST', name='joinWaitlist')
+    def joinWaitlist(self, request):
+        """Wait for a seat at a sold-out conference."""
+        return self._waitlistMembership(request)
+
+    @endpoints.method(CONF_GET_REQUEST, BooleanMessage,
+                      path='conference/{websafeConferenceKey}/waitlist',
+                      http_method='DELETE', name='leaveWaitlist')
+    def leaveWaitlist(self, request):
+        """Stop waiting for a seat at a conference."""
+        return self._waitlistMembership(request, join=False)
+
+    def _waitlistMembership(self, request, join=True):
+        """Add user to or remove user from a conference waitlist."""
+        prof = self._getProfileFromUser()  # get user Profile
+        wsck = request.websafeConferenceKey
+        if join and wsck in prof.conferenceKeysToAttend:
+            raise ConflictException(
+                "You have already registered for this conference")
+
+        @ndb.transactional()
+        def update(conf_key):
+            conf = conf_key.get()
+            if not conf:
+                raise endpoints.NotFoundException(
+                    'No conference found with key: %s' % wsck)
+            entry_key = ndb.Key(WaitlistEntry, prof.key.id(), parent=conf_key)
+            entry = entry_key.get()
+            if not join:
+                if entry:
+                    entry_key.delete()
+                return bool(entry)
+            if conf.seatsAvailable > 0:
+                raise ConflictException(
+                    "There are seats available; register instead.")
+            # joining twice keeps the original place in line
+            if entry:
+                return False
+            WaitlistEntry(key=entry_key).put()
+            return True
+
+        return BooleanMessage(data=update(ndb.Key(urlsafe=wsck)))
+
+    @staticmethod
+    def _queueWaitlistPromotion(conf):
+        """Queue promotion of waitlisted users after seats free up.
+
+        Must be called in a transaction on conf, which keeps the task
+        from being queued unless the freed seats are committed.
+        """
+        if WaitlistEntry.query(ancestor=conf.key).get(keys_only=True):
+            taskqueue.add(params={'websafeConferenceKey': conf.key.urlsafe()},
+                          url='/tasks/promote_waitlist',
+                          transactional=True)
+
+    @staticmethod
+    @ndb.transactional(xg=True)
+    def _promoteWaitlist(websafeConferenceKey):
+        """Register the next batch of waitlisted users while seats last;
+        return True if another batch may still be promoted."""
+        conf_key = ndb.Key(urlsafe=websafeConferenceKey)
+        conf = conf_key.get()
+        if not conf or conf.seatsAvailable <= 0:
+            return False
+        # one more than a batch tells whether anyone is left waiting;
+        # reads in the transaction won't see the deletes below
+        entries = WaitlistEntry.query(ancestor=conf_key).order(
+            WaitlistEntry.joined).fetch(WAITLIST_BATCH + 1, keys_only=True)
+        if not entries:
+            return False
+
+        facets = ConferenceApi._facetValues(conf)
+        seats = conf.seatsAvailable
+        profiles = ndb.get_multi([ndb.Key(Profile, e.id())
+                                  for e in entries[:WAITLIST_BATCH]])
+        promoted, done = [], []
+        for entry, prof in zip(entries, profiles):
+            if conf.seatsAvailable <= 0:
+                break
+            done.append(entry)
+            # gone or already registered: just drop them from the line
+            if prof and conf_key.urlsafe() not in prof.conferenceKeysToAttend:
+                prof.conferenceKeysToAttend.append(conf_key.urlsafe())
+                conf.seatsAvailable -= 1
+                promoted.append(prof)
+
+        # agendas share their profile's entity group
+        agendas = [agenda for agenda in ndb.get_multi(
+            [ndb.Key(Agenda, AGENDA_ID, parent=prof.key) for prof in promoted])
+            if agenda]
+        for agenda in agendas:
+            ConferenceApi._changeAgenda(agenda, add=conf)
+
+        ndb.put_multi(promoted + agendas + [conf])
+        ndb.delete_multi(done)
+        ConferenceApi._updateStats(conf, len(promoted))
+        ConferenceApi._queueFacetDeltas(facets, ConferenceApi._facetValues(conf))
+        ConferenceApi._seatsChanged(seats, conf.seatsAvailable)
+        ConferenceApi._bumpVersions(
+            'conference:%s' % conf_key.urlsafe(),
+            *['profile:%s' % prof.key.id() for prof in promoted])
+        return conf.seatsAvailable > 0 and len(entries) > len(done)
 
     @endpoints.method(message_types.VoidMessage, ConferenceForms,
                       path='conferences/attending',
@@ -525,35 +1744,39 @@ class ConferenceApi(remote.Service):
         """Get list of conferences that user has registered for."""
         prof = self._getProfileFromUser()  # get user Profile
         conf_keys = [ndb.Key(urlsafe=wsck) for wsck in prof.conferenceKeysToAttend]
-        conferences = ndb.get_multi(conf_keys)
-
-        # get organizers
-        organisers = [ndb.Key(Profile, conf.organizerUserId) for conf in conferences]
-        profiles = ndb.get_multi(organisers)
-
-        # put display names in a dict for easier fetching
-        names = {}
-        for profile in profiles:
-            names[profile.key.id()] = profile.displayName
+        # deleted conferences stay on the profile until their cleanup
+        # task gets to it
+        conferences = [conf for conf in ndb.get_multi(conf_keys) if conf]
 
         # return set of ConferenceForm objects per Conference
-        return ConferenceForms(items=[self._copyConferenceToForm(
-            conf, names[conf.organizerUserId]) for conf in conferences]
-        )
+        return self._copyConferencesToForms(conferences)
 
-    @endpoints.method(CONF_GET_REQUEST, BooleanMessage,
+    @endpoints.method(CONF_REGISTER_REQUEST, BooleanMessage,
                       path='conference/{websafeConferenceKey}',
                       http_method='POST', name='registerForConference')
     def registerForConference(self, request):
         """Register user for selected conference."""
-        return self._conferenceRegistration(request)
-
-    @endpoints.method(CONF_GET_REQUEST, BooleanMessage,
+        # replays are answered before they cost a token or a transaction
+        replay = self._replayedOutcome('registerForConference',
+                                       request.websafeConferenceKey,
+                                       request.requestId)
+        if replay is not None:
+            return replay
+        self._admit('registerForConference',
+                    ndb.Key(urlsafe=request.websafeConferenceKey))
+        return self._transact(self._conferenceRegistration, request)
+
+    @endpoints.method(CONF_REGISTER_REQUEST, BooleanMessage,
                       path='conference/{websafeConferenceKey}',
                       http_method='DELETE', name='unregisterFromConference')
     def unregisterFromConference(self, request):
         """Unregister user for selected conference."""
-        return self._conferenceRegistration(request, reg=False)
+        replay = self._replayedOutcome('unregisterFromConference',
+                                       request.websafeConferenceKey,
+                                       request.requestId)
+        if replay is not None:
+            return replay
+        return self._transact(self._conferenceRegistration, request, reg=False)
 
     @endpoints.method(message_types.VoidMessage, ConferenceForms,
                       path='filterPlayground',
@@ -567,16 +1790,51 @@ class ConferenceApi(remote.Service):
         # f = ndb.query.FilterNode(field, operator, value)
         # q = q.filter(f)
         q = q.filter(Conference.city == "London")
-        q = q.filter(Conference.topics == "Medical Innovations")
         q = q.filter(Conference.month == 6)
+        confs = self._fetchWithTopics(q, ["medical-innovations"], [
+            {"field": "city", "operator": "=", "value": "London"},
+            {"field": "month", "operator": "=", "value": 6}])
 
         return ConferenceForms(
-            items=[self._copyConferenceToForm(conf, "") for conf in q]
+            items=[self._copyConferenceToForm(conf, "") for conf in confs]
         )
 
 
 # --------------- Begin Session Object --------------- #
 
+    @staticmethod
+    def _sessionKey(clientId):
+        """Return the Session key of a client id or websafe key; raise
+        BadRequest if it is neither."""
+        try:
+            key = sessionKey(clientId)
+        except ValueError:
+            key = None
+        if not key or key.kind() != 'Session':
+            raise endpoints.BadRequestException(
+                'Invalid session key: %s' % clientId)
+        return ConferenceApi._movedSessionKeys([key])[0]
+
+    @staticmethod
+    @ndb.non_transactional
+    def _movedSessionKeys(keys):
+        """Return keys with the legacy keys of sessions the
+        compact_session_keys mapper moved replaced by their new keys."""
+        legacy = [key for key in keys if key.parent() and key.parent().string_id()]
+        if not legacy:
+            return keys
+        moved = dict((key, sessionKey(move.sessionId)) for key, move in zip(
+            legacy, ndb.get_multi([ndb.Key(SessionKeyMove, key.urlsafe())
+                                   for key in legacy])) if move)
+        return [moved.get(key, key) for key in keys]
+
+    @staticmethod
+    def _clientKey(key):
+        """Return the id clients know a Conference or Session key by."""
+        if key.kind() == 'Session':
+            return sessionClientId(key)
+        return key.urlsafe()
+
     def _copySessionToForm(self, sess):
         """Copy relevant fields from Session to SessionForm."""
         sf = SessionForm()
@@ -588,11 +1846,26 @@ class ConferenceApi(remote.Service):
                 else:
                     setattr(sf, field.name, getattr(sess, field.name))
             elif field.name == "websafeKey":
-                setattr(sf, field.name, sess.key.urlsafe())
+                setattr(sf, field.name, sessionClientId(sess.key))
+            elif field.name == "speakerEmail" and sess.speakerKey:
+                setattr(sf, field.name, sess.speakerKey.id())
         # make sure all required form fields are filled out and return
         sf.check_initialized()
         return sf
 
+    @staticmethod
+    @ndb.non_transactional
+    def _resolveSpeaker(email, name):
+        """Return the Speaker with email, adding one named name if it
+        is new; raise BadRequest for an invalid email."""
+        speaker_id = normalizeEmail(email)
+        if '@' not in speaker_id:
+            raise endpoints.BadRequestException(
+                "Invalid 'speakerEmail': %s" % email)
+        # first spelling seen becomes the canonical name
+        return Speaker.get_or_insert(speaker_id, name=name.strip(),
+                                     mainEmail=email.strip())
+
     def _createSessionObject(self, request):
         """Create or update Session object, returning SessionForm/request."""
         # check if user is logged in
@@ -629,38 +1902,51 @@ class ConferenceApi(remote.Service):
                 data[df] = DEFAULTS[df]
                 setattr(request, df, DEFAULTS[df])
 
-        # convert dates from strings to Date objects; set month based on start_date
+        # convert dates from strings to Date objects; set month & the
+        # timeline buckets based on start_date
         if data['startDate']:
-            data['startDate'] = datetime.strptime(data['startDate'][:10], "%Y-%m-%d").date()
+            data['startDate'] = self._parseDate(data['startDate'], 'startDate')
             data['month'] = data['startDate'].month
         else:
             data['month'] = 0
+        data['weekBucket'], data['monthBucket'] = self._dateBuckets(
+            data['startDate'])
         if data['endDate']:
-            data['endDate'] = datetime.strptime(data['endDate'][:10], "%Y-%m-%d").date()
+            data['endDate'] = self._parseDate(data['endDate'], 'endDate')
 
         # set seatsAvailable to be same as maxAttendees on creation
         if data["maxAttendees"] > 0:
             data["seatsAvailable"] = data["maxAttendees"]
-        # generate Conference parent key from user-provided string
-        # allocate session id using using p_key as parent
-        p_key = ndb.Key(Conference, conf_key.urlsafe())
-        sess_id = Session.allocate_ids(size=1, parent=p_key)[0]
-        sess_key = ndb.Key(Session, sess_id, parent=p_key)
+        # allocate session id under the conference it belongs to
+        sess_id = Session.allocate_ids(size=1, parent=conf_key)[0]
+        sess_key = ndb.Key(Session, sess_id, parent=conf_key)
         data['key'] = sess_key
         data['organizerUserId'] = request.organizerUserId = user_id
 
+        # sessions given a speaker email share that speaker's name, so
+        # that spelling variants don't split their sessions
+        if data['speakerEmail']:
+            speaker = self._resolveSpeaker(data['speakerEmail'], data['speaker'])
+            data['speakerKey'] = speaker.key
+            data['speaker'] = request.speaker = speaker.name
+            request.speakerEmail = speaker.key.id()
+
         # Remove fields in our form not found in our session model
         del data['websafeKey']
         del data['organizerDisplayName']
+        del data['speakerEmail']
 
         # create session, 
-        Session(**data).put()        
+        sess = Session(**data)
+        sess.put()
+        self._indexForSearch(sess)
+        self._bumpVersions('sessions:%s' % conf_key.urlsafe())
 
-        # start task to determine featured speaker
-        taskqueue.add(params={'speaker': data['speaker'],
-                              'websafeConferenceKey': request.websafeKey},
-                      url='/tasks/set_featured_speaker',
-                      method='POST')
+        # mark conference for the next featured speaker recompute
+        coalescing.markDirty('featured_speaker', request.websafeKey,
+                             data['speaker'])
+        coalescing.markDirty('conference_stats', request.websafeKey,
+                             ['session', sessionClientId(sess_key), data['name']])
 
         return request
 
@@ -680,20 +1966,24 @@ class ConferenceApi(remote.Service):
         if not user:
             raise endpoints.UnauthorizedException('Authorization required')
 
+        # skip the queries entirely if the client's copy is current
+        conf_key = ndb.Key(urlsafe=request.websafeConferenceKey)
+        etag = self._checkEtag('sessions:%s' % conf_key.urlsafe())
+
         # use the user-provided string to retrieve target conference
-        conf = ndb.Key(urlsafe=request.websafeConferenceKey).get()
+        conf = conf_key.get()
         # check the conference exists
         if not conf:
             raise endpoints.NotFoundException(
                 'The conference you requested does not exist.')
 
         # create ancestor query for all key matches for this conference
-        sess_query = Session.query(
-            ancestor=ndb.Key(Conference, request.websafeConferenceKey))      
+        sessions = self._conferenceSessions(conf_key)
 
         # return set of SessionForm objects per Session
         return SessionForms(
-            items=[self._copySessionToForm(sess) for sess in sess_query]
+            items=[self._copySessionToForm(sess) for sess in sessions],
+            etag=etag
         )
 
     @endpoints.method(message_types.VoidMessage, SessionForms,
@@ -708,6 +1998,18 @@ class ConferenceApi(remote.Service):
             items=[self._copySessionToForm(sess) for sess in q]
         )
 
+    @endpoints.method(message_types.VoidMessage, SessionSummaryForms,
+                      path='sessions/getAllExistingSessionSummaries',
+                      http_method='GET', name='getAllExistingSessionSummaries')
+    def getAllExistingSessionSummaries(self, request):
+        """Return summaries of ALL existing sessions from the index alone"""
+        sessions = Session.query().fetch(projection=SUMMARY_FIELDS)
+
+        return SessionSummaryForms(
+            items=[self._copySummaryToForm(sess, SessionSummaryForm())
+                   for sess in sessions]
+        )
+
     @endpoints.method(SESS_SIZE_REQUEST, SessionForms,
                       path='sessions/getSessionsBySize/{sessionSize}',
                       http_method='GET', name='getSessionsBySize')
@@ -738,15 +2040,13 @@ class ConferenceApi(remote.Service):
             raise endpoints.NotFoundException(
                 'The conference you requested does not exist.')
 
-        # create ancestor query for all key matches for this conference
-        sess_query = Session.query(
-            ancestor=ndb.Key(Conference, request.websafeConferenceKey))
-        # now filter results by session type
-        sess_query = sess_query.filter(
-            Session.sessionType == request.sessionType)
+        # create ancestor queries for all key matches for this
+        # conference, filtered by session type
+        sessions = self._conferenceSessions(
+            conf.key, Session.sessionType == request.sessionType)
         # return set of SessionForm objects per Session
         return SessionForms(
-            items=[self._copySessionToForm(sess) for sess in sess_query]
+            items=[self._copySessionToForm(sess) for sess in sessions]
         )
 
     @endpoints.method(SESS_GET_BY_SPEAKER, SessionForms,
@@ -765,24 +2065,65 @@ class ConferenceApi(remote.Service):
             items=[self._copySessionToForm(sess) for sess in sess_query]
             )
 
-    @ndb.transactional(xg=True)
-    @endpoints.method(SESS_GET_REQUEST, BooleanMessage,
+    @endpoints.method(SPKR_GET_REQUEST, SpeakerForm,
+                      path='speaker/{speakerEmail}',
+                      http_method='GET', name='getSpeaker')
+    def getSpeaker(self, request):
+        """Return a speaker & their sessions across all conferences."""
+        # make sure user is authed
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+
+        speaker = ndb.Key(Speaker, normalizeEmail(request.speakerEmail)).get()
+        if not speaker:
+            raise endpoints.NotFoundException(
+                'No speaker found with email: %s' % request.speakerEmail)
+        # keys from the speakerKey index, entities in one batch
+        sess_keys = Session.query(Session.speakerKey == speaker.key).fetch(
+            keys_only=True)
+        return SpeakerForm(
+            name=speaker.name, mainEmail=speaker.mainEmail,
+            sessions=[self._copySessionToForm(sess)
+                      for sess in ndb.get_multi(sess_keys) if sess])
+
+    @endpoints.method(WISHLIST_REQUEST, BooleanMessage,
                       path='addSessionToWishlist/{websafeConferenceKey}',
                       http_method='GET', name='addSessionToWishlist')
     def addSessionToWishlist(self, request):
         """Add session with webSafeKey to wish list."""
+        replay = self._replayedOutcome('addSessionToWishlist',
+                                       request.websafeConferenceKey,
+                                       request.requestId)
+        if replay is not None:
+            return replay
+        # sessions of one conference share its budget
+        self._admit('addSessionToWishlist', self._sessionConferenceKey(
+            self._sessionKey(request.websafeConferenceKey)))
+        return self._transact(self._addSessionToWishlist, request)
+
+    def _addSessionToWishlist(self, request):
+        """Add session with webSafeKey to wish list; run in an xg
+        transaction."""
         retval = None
         prof = self._getProfileFromUser()  # get user Profile
+        replay = self._replayedOutcome('addSessionToWishlist',
+                                       request.websafeConferenceKey,
+                                       request.requestId, prof.key.id())
+        if replay is not None:
+            return replay
 
-        # check if conf exists given websafeConfKey
+        # check the session exists; wishlists hold its client id
         wsck = request.websafeConferenceKey
-        sess = ndb.Key(urlsafe=wsck).get()
+        sess = self._sessionKey(wsck).get()
         if not sess:
             raise endpoints.NotFoundException(
                 'No session found with key: %s' % wsck)
+        wssk = sessionClientId(sess.key)
+        resolved = self._resolveWishList(prof)
 
         # check if user already registered otherwise add
-        if wsck in prof.wishList:
+        if wssk in prof.wishList:
             raise ConflictException(
                 "You have already added this session to your list.")
 
@@ -791,12 +2132,22 @@ class ConferenceApi(remote.Service):
             raise ConflictException("There are no seats available.")
 
         # register user, take away one seat
-        prof.wishList.append(wsck)
+        others = prof.wishList[-RECOMMENDATIONS_MAX_OTHERS:]
+        prof.wishList.append(wssk)
         sess.seatsAvailable -= 1
         prof.put()
+        sess.put()
+        if not resolved:
+            self._updateAgenda(prof, add=sess)
+        self._markRecommendations(wssk, others, 1)
+        self._markStats(sess.key, 1)
+        # session listings carry seatsAvailable
+        self._bumpVersions('profile:%s' % prof.key.id(), 'sessions:%s' %
+                           self._sessionConferenceKey(sess.key).urlsafe())
         retval = True
 
-        return BooleanMessage(data=retval)
+        return self._recordOutcome(prof, 'addSessionToWishlist', wsck,
+                                   request.requestId, retval)
 
     @endpoints.method(message_types.VoidMessage, SessionForms,
                       path='getSessionsInWishList/attending',
@@ -806,9 +2157,9 @@ class ConferenceApi(remote.Service):
         # get user Profile
         prof = self._getProfileFromUser()
         # get stored keys of sessions interested in
-        sess_keys = [ndb.Key(urlsafe=wsck) for wsck in prof.wishList]
-        # fetch multiple sessions at once
-        sessions = ndb.get_multi(sess_keys)
+        sess_keys = [sessionKey(wssk) for wssk in prof.wishList]
+        # fetch multiple sessions at once, skipping deleted ones
+        sessions = [sess for sess in ndb.get_multi(sess_keys) if sess]
 
         # return set of Session objects per each session
         return SessionForms(
@@ -820,27 +2171,52 @@ class ConferenceApi(remote.Service):
                       http_method='POST', name='deleteSessionInWishList')
     def deleteSessionInWishList(self, request):
         """Remove a session from the user's wishlist"""
+        replay = self._replayedOutcome('deleteSessionInWishList',
+                                       request.webSafeKey, request.requestId)
+        if replay is not None:
+            return replay
+        return self._transact(self._deleteSessionInWishList, request)
+
+    def _deleteSessionInWishList(self, request):
+        """Remove a session from the user's wishlist; run in an xg
+        transaction."""
         retval = None
         prof = self._getProfileFromUser()  # get user Profile
+        replay = self._replayedOutcome('deleteSessionInWishList',
+                                       request.webSafeKey,
+                                       request.requestId, prof.key.id())
+        if replay is not None:
+            return replay
 
-        # check if conf exists given websafeConfKey
+        # check the session exists; wishlists hold its client id
         wsck = request.webSafeKey
-        sess = ndb.Key(urlsafe=wsck).get()
+        sess = self._sessionKey(wsck).get()
         if not sess:
             raise endpoints.NotFoundException(
                 'No session found with key: %s' % wsck)
+        wssk = sessionClientId(sess.key)
+        resolved = self._resolveWishList(prof)
 
         # check if user already registered
-        if wsck in prof.wishList:
+        if wssk in prof.wishList:
             # unregister user, add back one seat
-            prof.wishList.remove(wsck)
+            prof.wishList.remove(wssk)
             sess.seatsAvailable += 1
             prof.put()
+            sess.put()
+            if not resolved:
+                self._updateAgenda(prof, remove=wssk)
+            self._markRecommendations(
+                wssk, prof.wishList[-RECOMMENDATIONS_MAX_OTHERS:], -1)
+            self._markStats(sess.key, -1)
+            self._bumpVersions('profile:%s' % prof.key.id(), 'sessions:%s' %
+                               self._sessionConferenceKey(sess.key).urlsafe())
             retval = True
         else:
             retval = False
 
-        return BooleanMessage(data=retval)
+        return self._recordOutcome(prof, 'deleteSessionInWishList', wsck,
+                                   request.requestId, retval)
 
     @endpoints.method(SPKR_POST_REQUEST, BooleanMessage,
                       path='addSpeakerToSession/{websafeKey}/{speaker}',
@@ -856,27 +2232,737 @@ class ConferenceApi(remote.Service):
             raise endpoints.UnauthorizedException('Authorization required')
 
         # use the user-provided string to retrieve target conference
-        sess = ndb.Key(urlsafe=request.websafeKey).get()
+        sess = self._sessionKey(request.websafeKey).get()
         # check the session exists
         if not sess:
             raise endpoints.NotFoundException(
                 'The session you requested does not exist.')
 
-        # if it exists, add speaker to session and return true
-        sess.speaker = request.speaker
+        # if it exists, add speaker to session and return true; without
+        # an email the session no longer counts toward any Speaker
+        if request.speakerEmail:
+            speaker = self._resolveSpeaker(request.speakerEmail, request.speaker)
+            sess.speaker, sess.speakerKey = speaker.name, speaker.key
+        else:
+            sess.speaker, sess.speakerKey = request.speaker, None
         sess.put()
+        self._indexForSearch(sess)
+        self._bumpVersions(
+            'sessions:%s' % self._sessionConferenceKey(sess.key).urlsafe())
         retval = True
 
         return BooleanMessage(data=retval)
 
+# - - - Deletion - - - - - - - - - - - - - - - - - - - - - -
+
+    @ndb.transactional()
+    def _deleteConferenceObject(self, request):
+        """Delete a conference & queue the cleanup of what it leaves
+        behind: sessions, registrations, wishlist entries & the rows
+        stored under it."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        wsck = request.websafeConferenceKey
+        conf_key = ndb.Key(urlsafe=wsck)
+        conf = conf_key.get()
+        if not conf:
+            raise endpoints.NotFoundException(
+                'No conference found with key: %s' % wsck)
+        if getUserId(user) != conf.organizerUserId:
+            raise endpoints.ForbiddenException(
+                'Only the owner can delete the conference.')
+
+        # the rollup goes now so the dashboard drops the conference
+        ndb.delete_multi([conf_key,
+                          ndb.Key(ConferenceStats, STATS_ID, parent=conf_key)])
+        self._queueFacetDeltas(self._facetValues(conf), {})
+        self._seatsChanged(conf.seatsAvailable, 0)
+        self._bumpVersions('conference:%s' % wsck, 'sessions:%s' % wsck)
+        self._queueCleanUp(websafeConferenceKey=wsck)
+        return BooleanMessage(data=True)
+
+    @endpoints.method(CONF_GET_REQUEST, BooleanMessage,
+                      path='deleteConference/{websafeConferenceKey}',
+                      http_method='DELETE', name='deleteConference')
+    def deleteConference(self, request):
+        """Delete a conference along with its sessions."""
+        retval = self._deleteConferenceObject(request)
+        memcache.delete(MEMCACHE_CONF_FEATURED_SPEAKER_TPL %
+                        request.websafeConferenceKey)
+        return retval
+
+    @ndb.transactional()
+    def _deleteSessionObject(self, request):
+        """Delete a session & queue its removal from wishlists."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        sess = self._sessionKey(request.websafeSessionKey).get()
+        if not sess:
+            raise endpoints.NotFoundException(
+                'No session found with key: %s' % request.websafeSessionKey)
+        if getUserId(user) != sess.organizerUserId:
+            raise endpoints.ForbiddenException(
+                'Only the owner can delete the session.')
+
+        sess.key.delete()
+        wssk = sessionClientId(sess.key)
+        wsck = self._sessionConferenceKey(sess.key).urlsafe()
+        coalescing.markDirtyOnCommit('conference_stats', wsck,
+                                     ['deleted', wssk, None])
+        # the speaker may no longer have enough sessions to be featured
+        coalescing.markDirtyOnCommit('featured_speaker', wsck, sess.speaker)
+        self._bumpVersions('sessions:%s' % wsck)
+        self._queueCleanUp(websafeSessionKey=wssk)
+        return BooleanMessage(data=True)
+
+    @endpoints.method(SESS_DELETE_REQUEST, BooleanMessage,
+                      path='deleteSession/{websafeSessionKey}',
+                      http_method='DELETE', name='deleteSession')
+    def deleteSession(self, request):
+        """Delete a session & take it off every wishlist."""
+        return self._deleteSessionObject(request)
+
+    @staticmethod
+    def _queueCleanUp(**params):
+        """Queue the next cleanup step after a deleted conference or
+        session; inside a transaction, only once the delete commits."""
+        taskqueue.add(params=params, url='/tasks/clean_up_deleted',
+                      queue_name=CLEANUP_QUEUE,
+                      transactional=ndb.in_transaction())
+
+    @staticmethod
+    def _cleanUpConference(websafeConferenceKey):
+        """Clean up one batch after a deleted conference: its sessions
+        first, then its registrations, then what is stored under it;
+        return True if there may be more."""
+        conf_key = ndb.Key(urlsafe=websafeConferenceKey)
+        # sessions from before compact keys hang off a pseudo-conference
+        futures = [Session.query(ancestor=parent).fetch_async(
+            CLEANUP_SESSIONS, keys_only=True)
+            for parent in (conf_key, ndb.Key(Conference, websafeConferenceKey))]
+        sess_keys = [key for future in futures for key in future.get_result()]
+        if sess_keys:
+            ConferenceApi._dropSessions(sess_keys)
+            return True
+
+        prof_keys = Profile.query(
+            Profile.conferenceKeysToAttend == websafeConferenceKey).fetch(
+                CLEANUP_BATCH, keys_only=True)
+        if prof_keys:
+            for prof_key in prof_keys:
+                ConferenceApi._dropReferences(prof_key, websafeConferenceKey)
+            return True
+
+        # waitlist, topic & search rows, featured speaker...
+        keys = ndb.Query(ancestor=conf_key).fetch(CLEANUP_BATCH, keys_only=True)
+        ndb.delete_multi(keys)
+        return len(keys) == CLEANUP_BATCH
+
+    @staticmethod
+    def _cleanUpSession(websafeSessionKey):
+        """Clean up one batch after a deleted session; return True if
+        there may be more."""
+        return not ConferenceApi._dropSessions(
+            [sessionKey(websafeSessionKey)])
+
+    @staticmethod
+    def _dropSessions(sess_keys):
+        """Take deleted sessions off one batch of the wishlists holding
+        them; delete the rows stored under the sessions no wishlist
+        holds anymore & return True if that was all of them."""
+        wssks = [sessionClientId(key) for key in sess_keys]
+        futures = [Profile.query(Profile.wishList == wssk).fetch_async(
+            CLEANUP_BATCH, keys_only=True) for wssk in wssks]
+        holders, done = {}, []
+        for sess_key, wssk, future in zip(sess_keys, wssks, futures):
+            prof_keys = future.get_result()
+            for prof_key in prof_keys:
+                holders.setdefault(prof_key, []).append(wssk)
+            if len(prof_keys) < CLEANUP_BATCH:
+                done.append(sess_key)
+        for prof_key, dropped in holders.items():
+            ConferenceApi._dropReferences(prof_key, wssks=dropped)
+        # sessions go along with their search postings & recommendations
+        ConferenceApi._deleteDescendants(done)
+        return len(done) == len(sess_keys)
+
+    @staticmethod
+    @ndb.transactional()
+    def _dropReferences(prof_key, wsck=None, wssks=()):
+        """Take a deleted conference and/or deleted sessions off a
+        profile & its agenda."""
+        prof = prof_key.get()
+        if not prof:
+            return
+        dropped = ([wsck] if wsck in prof.conferenceKeysToAttend else []) + \
+            [wssk for wssk in wssks if wssk in prof.wishList]
+        if not dropped:
+            return
+        prof.conferenceKeysToAttend = [
+            key for key in prof.conferenceKeysToAttend if key != wsck]
+        prof.wishList = [key for key in prof.wishList if key not in wssks]
+        agenda = ndb.Key(Agenda, AGENDA_ID, parent=prof_key).get()
+        if agenda:
+            for key in dropped:
+                ConferenceApi._changeAgenda(agenda, remove=key)
+            agenda.put()
+        prof.put()
+        ConferenceApi._bumpVersions('profile:%s' % prof_key.id())
+
+    @staticmethod
+    def _deleteDescendants(keys):
+        """Delete keys & everything stored under them."""
+        futures = [ndb.Query(ancestor=key).fetch_async(keys_only=True)
+                   for key in keys]
+        ndb.delete_multi([key for future in futures
+                          for key in future.get_result()])
+
+# - - - Migrations - - - - - - - - - - - - - - - - - - - - -
+
+    @staticmethod
+    def _recountSessionSeats(sessions):
+        """Recompute seatsAvailable of a batch of sessions from the
+        wishlists holding them; return the sessions that were off.
+
+        The wishlist counts aren't transactional with wishlist writes,
+        so run this while wishlists are quiet.
+        """
+        counts = ConferenceApi._wishlistCounts([sess.key for sess in sessions])
+        changed = []
+        for sess, count in zip(sessions, counts):
+            seats = max(0, (sess.maxAttendees or 0) - count)
+            if sess.seatsAvailable != seats:
+                sess.seatsAvailable = seats
+                changed.append(sess)
+        return changed
+
+    @staticmethod
+    @ndb.non_transactional
+    def _wishlistCounts(sess_keys):
+        """Return how many wishlists hold each of sess_keys."""
+        futures = [Profile.query(Profile.wishList == sessionClientId(key))
+                   .count_async() for key in sess_keys]
+        return [future.get_result() for future in futures]
+
+    @staticmethod
+    def _compactSessionKeys(sessions):
+        """Move a batch of sessions off their pseudo-conference parents
+        onto the conferences themselves; mapper function of the
+        'compact_session_keys' mapper."""
+        for sess in sessions:
+            if sess.key.parent().string_id():
+                ConferenceApi._compactSessionKey(sess.key)
+        return []
+
+    @staticmethod
+    @ndb.transactional(xg=True)
+    def _compactSessionKey(old_key):
+        """Move one session onto its conference.
+
+        The copy, the delete of the old session & the SessionKeyMove
+        record that compact_wishlists & legacy keys are mapped through
+        commit together, so seat changes made meanwhile can't be lost
+        and a rerun finds the session already gone.
+        """
+        sess = old_key.get()
+        if not sess:
+            return
+        conf_key = ConferenceApi._sessionConferenceKey(old_key)
+        target = ndb.Key(Session, old_key.id(), parent=conf_key)
+        # keep the session id unless its conference already has one by it
+        if target.get():
+            target = ndb.Key(Session, ndb.non_transactional(Session.allocate_ids)(
+                size=1, parent=conf_key)[0], parent=conf_key)
+        moved = Session(key=target, **sess.to_dict())
+        moved.put()
+        SessionKeyMove(id=old_key.urlsafe(),
+                       sessionId=sessionClientId(target)).put()
+        ConferenceApi._indexForSearch(moved)
+        # the old session goes along with its search postings &
+        # recommendations
+        ndb.delete_multi(ndb.Query(ancestor=old_key).fetch(keys_only=True))
+
+    @staticmethod
+    def _compactWishlists(profiles):
+        """Repoint wishlists of a batch of profiles at the client ids of
+        moved sessions; mapper function of the 'compact_wishlists' mapper.
+        Agendas of rewritten profiles are dropped, to be rebuilt on read."""
+        legacy = list(set(wssk for prof in profiles for wssk in prof.wishList
+                          if not wssk.startswith(SESSION_ID_PREFIX)))
+        if not legacy:
+            return []
+        moves = ConferenceApi._sessionMoves(legacy)
+        changed = []
+        for prof in profiles:
+            wishList = [moves.get(wssk, wssk) for wssk in prof.wishList]
+            if wishList != prof.wishList:
+                prof.wishList = wishList
+                changed.append(prof)
+        ndb.delete_multi([ndb.Key(Agenda, AGENDA_ID, parent=prof.key)
+                          for prof in changed])
+        return changed
+
+    @staticmethod
+    def _resolveWishList(prof):
+        """Repoint legacy keys on the wishlist of prof at the client ids
+        of moved sessions, ahead of compact_wishlists; return True if
+        any was. The agenda of prof is then dropped, to be rebuilt on
+        read, as compact_wishlists does; call in the transaction that
+        writes prof."""
+        legacy = [wssk for wssk in prof.wishList
+                  if not wssk.startswith(SESSION_ID_PREFIX)]
+        moves = ConferenceApi._sessionMoves(legacy) if legacy else {}
+        if not moves:
+            return False
+        prof.wishList = [moves.get(wssk, wssk) for wssk in prof.wishList]
+        ndb.Key(Agenda, AGENDA_ID, parent=prof.key).delete()
+        return True
+
+    @staticmethod
+    @ndb.non_transactional
+    def _sessionMoves(wssks):
+        """Return {old websafe key: client id} of the moved sessions
+        among wssks."""
+        return dict((wssk, move.sessionId) for wssk, move in zip(
+            wssks, ndb.get_multi([ndb.Key(SessionKeyMove, wssk)
+                                  for wssk in wssks])) if move)
+
+    @staticmethod
+    def _backfillDates(entity):
+        """Set month & timeline buckets of a Conference or Session from
+        its startDate; return True if any of them was missing or stale."""
+        month = entity.startDate.month if entity.startDate else 0
+        week_bucket, month_bucket = ConferenceApi._dateBuckets(entity.startDate)
+        if (entity.month == month and entity.weekBucket == week_bucket and
+                entity.monthBucket == month_bucket):
+            return False
+        entity.month = month
+        entity.weekBucket, entity.monthBucket = week_bucket, month_bucket
+        return True
+
+# - - - Batch gets - - - - - - - - - - - - - - - - - - - - -
+
+    @staticmethod
+    def _keysFromWebsafe(websafeKeys, kind):
+        """Return ([(websafe key, key of kind)], [websafe keys that
+        aren't]) for the distinct keys of a batch get, in request order;
+        sessions may be given by client id."""
+        websafeKeys = list(OrderedDict.fromkeys(websafeKeys))
+        if len(websafeKeys) > BATCH_GET_MAX_KEYS:
+            raise endpoints.BadRequestException(
+                'At most %d keys per request.' % BATCH_GET_MAX_KEYS)
+        keys, missing = [], []
+        for wsk in websafeKeys:
+            try:
+                key = sessionKey(wsk) if kind == 'Session' else ndb.Key(urlsafe=wsk)
+            except Exception:
+                key = None
+            if key and key.kind() == kind:
+                keys.append((wsk, key))
+            else:
+                missing.append(wsk)
+        if kind == 'Session' and keys:
+            keys = list(zip([wsk for wsk, _ in keys],
+                            ConferenceApi._movedSessionKeys(
+                                [key for _, key in keys])))
+        return keys, missing
+
+    @endpoints.method(WebsafeKeysForm, ConferenceForms,
+                      path='conferences/byKeys',
+                      http_method='POST', name='getConferencesByKeys')
+    def getConferencesByKeys(self, request):
+        """Return many conferences at once; keys that don't name a
+        conference come back in missingKeys."""
+        keys, missing = self._keysFromWebsafe(request.websafeKeys, 'Conference')
+        conferences = []
+        for (wsck, _), conf in zip(keys, ndb.get_multi(
+                [key for _, key in keys])):
+            if conf:
+                conferences.append(conf)
+            else:
+                missing.append(wsck)
+        forms = self._copyConferencesToForms(conferences)
+        forms.missingKeys = missing
+        return forms
+
+    @endpoints.method(WebsafeKeysForm, SessionForms,
+                      path='sessions/byKeys',
+                      http_method='POST', name='getSessionsByKeys')
+    def getSessionsByKeys(self, request):
+        """Return many sessions at once; keys that don't name a
+        session come back in missingKeys."""
+        keys, missing = self._keysFromWebsafe(request.websafeKeys, 'Session')
+        items = []
+        for (wssk, _), sess in zip(keys, ndb.get_multi(
+                [key for _, key in keys])):
+            if sess:
+                items.append(self._copySessionToForm(sess))
+            else:
+                missing.append(wssk)
+        return SessionForms(items=items, missingKeys=missing)
+
+# - - - Timeline - - - - - - - - - - - - - - - - - - - - - -
+
+    def _timelineQuery(self, model, request):
+        """Return query over model for the requested date window,
+        ordered by startDate, along with the page size & start cursor.
+
+        A week or month is an equality filter on its precomputed bucket;
+        either way the query is a single scan of one index in date order.
+        """
+        if request.week and request.month:
+            raise endpoints.BadRequestException(
+                "Give either 'week' or 'month', not both.")
+        q = model.query()
+        if request.week:
+            match = TIMELINE_WEEK_RE.match(request.week)
+            if not match or not 1 <= int(match.group(2)) <= 53:
+                raise endpoints.BadRequestException(
+                    "Invalid 'week' field; expected YYYY-Www.")
+            q = q.filter(model.weekBucket ==
+                         int(match.group(1)) * 100 + int(match.group(2)))
+        elif request.month:
+            match = TIMELINE_MONTH_RE.match(request.month)
+            if not match or not 1 <= int(match.group(2)) <= 12:
+                raise endpoints.BadRequestException(
+                    "Invalid 'month' field; expected YYYY-MM.")
+            q = q.filter(model.monthBucket ==
+                         int(match.group(1)) * 100 + int(match.group(2)))
+
+        # without a bucket, the timeline starts with what's upcoming
+        if request.startDate:
+            q = q.filter(model.startDate >=
+                         self._parseDate(request.startDate, 'startDate'))
+        elif not (request.week or request.month):
+            q = q.filter(model.startDate >= datetime.utcnow().date())
+        if request.endDate:
+            q = q.filter(model.startDate <=
+                         self._parseDate(request.endDate, 'endDate'))
+        q = q.order(model.startDate)
+
+        limit = min(request.limit or TIMELINE_PAGE_SIZE, TIMELINE_MAX_PAGE_SIZE)
+        try:
+            cursor = ndb.Cursor(urlsafe=request.pageToken) \
+                if request.pageToken else None
+        except (datastore_errors.BadValueError, TypeError, ValueError):
+            raise endpoints.BadRequestException("Invalid 'pageToken'.")
+        return q, limit, cursor
+
+    @endpoints.method(TIMELINE_REQUEST, ConferenceForms,
+                      path='timeline/conferences',
+                      http_method='GET', name='getConferenceTimeline')
+    def getConferenceTimeline(self, request):
+        """Return a page of conferences in date order, upcoming ones
+        unless a date range, week or month is given."""
+        q, limit, cursor = self._timelineQuery(Conference, request)
+        conferences, next_cursor, more = q.fetch_page(
+            limit, start_cursor=cursor)
+        return self._copyConferencesToForms(
+            conferences, next_cursor.urlsafe() if more and next_cursor else None)
+
+    @endpoints.method(TIMELINE_REQUEST, SessionForms,
+                      path='timeline/sessions',
+                      http_method='GET', name='getSessionTimeline')
+    def getSessionTimeline(self, request):
+        """Return a page of sessions across all conferences in date
+        order, upcoming ones unless a date range, week or month is given."""
+        q, limit, cursor = self._timelineQuery(Session, request)
+        sessions, next_cursor, more = q.fetch_page(limit, start_cursor=cursor)
+        return SessionForms(
+            items=[self._copySessionToForm(sess) for sess in sessions],
+            nextPageToken=next_cursor.urlsafe() if more and next_cursor else None
+        )
+
+# - - - Recommendations - - - - - - - - - - - - - - - - - - -
+
+    @staticmethod
+    def _recommendationRows(top):
+        """Return SessionRecommendations for {session websafe key:
+        [(neighbor websafe key, count), ...]}, naming the neighbors so
+        that they can be served without looking them up."""
+        wanted = list(set(other for neighbors in top.values()
+                          for other, _ in neighbors))
+        sessions = dict(
+            (wssk, sess) for wssk, sess in zip(wanted, ndb.get_multi(
+                [sessionKey(wssk) for wssk in wanted])) if sess)
+        return [SessionRecommendations(
+            id=RECOMMENDATIONS_ID, parent=sessionKey(wssk),
+            neighbors=[{
+                'websafeKey': other,
+                'count': count,
+                'name': sessions[other].name,
+                'speaker': sessions[other].speaker,
+                'startDate': (str(sessions[other].startDate)
+                              if sessions[other].startDate else None),
+            } for other, count in neighbors if other in sessions])
+            for wssk, neighbors in top.items()]
+
+    @staticmethod
+    def _startRecommendations():
+        """Queue tonight's rebuild of every shard of recommendations."""
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0,
+                                          microsecond=0)
+        # builds of earlier nights have nothing left to resume
+        ConferenceApi._deleteDescendants(list(RecommendationBuild.query(
+            RecommendationBuild.started < today).iter(keys_only=True)))
+        for shard in range(RECOMMENDATIONS_SHARDS):
+            ConferenceApi._queueRecommendations(
+                RECOMMENDATIONS_BUILD_TPL % (today.strftime('%Y-%m-%d'),
+                                             shard, RECOMMENDATIONS_SHARDS),
+                shard, RECOMMENDATIONS_SHARDS, 0)
+
+    @staticmethod
+    def _queueRecommendations(buildId, shard, shards, generation):
+        """Queue the task resuming build buildId from checkpoint
+        generation; returns quietly if that task was already queued."""
+        try:
+            taskqueue.add(name='recommendations-%s-%d' % (buildId, generation),
+                          params={'build': buildId, 'shard': shard,
+                                  'shards': shards},
+                          url='/tasks/rebuild_recommendations')
+        except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+            pass
+
+    @staticmethod
+    def _rebuildRecommendations(buildId, shard=0, shards=1):
+        """Recount wishlist co-occurrence over every profile for the
+        sessions of one shard & store their top neighbors.
+
+        Counting resumes from the last checkpoint of build buildId; a
+        task out of time checkpoints its counts & queues the next one.
+        """
+        build = RecommendationBuild.get_or_insert(buildId)
+        if build.finished:
+            return
+        counter = CooccurrenceCounter(RECOMMENDATIONS_CAPACITY, shard, shards)
+        if build.cursor:
+            counter.rows = ConferenceApi._loadRecommendationCounts(build)
+        profiles = Profile.query().iter(
+            batch_size=RECOMMENDATIONS_BATCH, produce_cursors=True,
+            start_cursor=ndb.Cursor(urlsafe=build.cursor) if build.cursor else None)
+        deadline = time.time() + RECOMMENDATIONS_TIME_BUDGET
+        for prof in profiles:
+            counter.add(prof.wishList)
+            if time.time() > deadline:
+                ConferenceApi._checkpointRecommendations(
+                    build, counter.rows, profiles.cursor_after())
+                ConferenceApi._queueRecommendations(
+                    buildId, shard, shards, build.generation)
+                return
+        top = counter.top(RECOMMENDATIONS_K)
+
+        wssks = sorted(top)
+        for i in range(0, len(wssks), RECOMMENDATIONS_BATCH):
+            ndb.put_multi(ConferenceApi._recommendationRows(dict(
+                (wssk, top[wssk])
+                for wssk in wssks[i:i + RECOMMENDATIONS_BATCH])))
+
+        # sessions no longer wishlisted along with any other; rows of
+        # those that are were all written since the build started
+        ndb.delete_multi([
+            key for key in SessionRecommendations.query(
+                SessionRecommendations.updated < build.started).iter(
+                    keys_only=True)
+            if inShard(sessionClientId(key.parent()), shard, shards) and
+            sessionClientId(key.parent()) not in top])
+
+        build.finished = datetime.utcnow()
+        build.put()
+        ndb.delete_multi(RecommendationCounts.query(ancestor=build.key).fetch(
+            keys_only=True))
+
+    @staticmethod
+    def _countsKeys(build):
+        """Return the keys of the counts chunks of build's checkpoint."""
+        return [ndb.Key(RecommendationCounts, '%d-%d' % (build.generation, i),
+                        parent=build.key) for i in range(build.chunks)]
+
+    @staticmethod
+    def _loadRecommendationCounts(build):
+        """Return the neighbor counts saved at build's checkpoint."""
+        data = b''.join(chunk.data for chunk in ndb.get_multi(
+            ConferenceApi._countsKeys(build)))
+        return json.loads(zlib.decompress(data).decode('utf-8'))
+
+    @staticmethod
+    def _checkpointRecommendations(build, rows, cursor):
+        """Save neighbor counts rows & the profile cursor they were
+        counted up to as the next checkpoint of build.
+
+        Chunks of the new checkpoint are written before the build
+        points at them, so a task dying midway leaves the last one
+        intact.
+        """
+        old_keys = ConferenceApi._countsKeys(build)
+        data = zlib.compress(json.dumps(rows).encode('utf-8'))
+        chunks = [data[i:i + RECOMMENDATIONS_CHUNK_BYTES]
+                  for i in range(0, len(data), RECOMMENDATIONS_CHUNK_BYTES)]
+        build.generation += 1
+        ndb.put_multi([RecommendationCounts(
+            id='%d-%d' % (build.generation, i), parent=build.key, data=chunk)
+            for i, chunk in enumerate(chunks)])
+        build.chunks = len(chunks)
+        build.cursor = cursor.urlsafe()
+        build.put()
+        ndb.delete_multi(old_keys)
+
+    @staticmethod
+    def _markRecommendations(wssk, others, sign):
+        """Queue the recommendation change of session wssk joining
+        (sign 1) or leaving (sign -1) a wishlist holding others, once
+        the current transaction commits."""
+        if others:
+            coalescing.markDirtyOnCommit('recommendations', wssk,
+                                         [sign, list(others)])
+
+    @staticmethod
+    def _applyRecommendationDeltas(marks):
+        """Fold the wishlist changes of marked sessions into the stored
+        neighbors of every session they affect."""
+        deltas = {}
+        for wssk, changes in marks:
+            for sign, others in changes:
+                addPairDeltas(deltas, wssk, others, sign)
+        wssks = list(deltas)
+        rows = ndb.get_multi([
+            ndb.Key(SessionRecommendations, RECOMMENDATIONS_ID,
+                    parent=sessionKey(wssk)) for wssk in wssks])
+        top, gone = {}, []
+        for wssk, row in zip(wssks, rows):
+            neighbors = mergeDeltas(
+                [(n['websafeKey'], n['count']) for n in (row.neighbors if row else [])],
+                deltas[wssk], RECOMMENDATIONS_K)
+            if neighbors:
+                top[wssk] = neighbors
+            elif row:
+                gone.append(row.key)
+        ndb.put_multi(ConferenceApi._recommendationRows(top))
+        ndb.delete_multi(gone)
+
+    @endpoints.method(RECOMMENDED_REQUEST, RecommendedSessionForms,
+                      path='session/{websafeSessionKey}/recommended',
+                      http_method='GET', name='getRecommendedSessions')
+    def getRecommendedSessions(self, request):
+        """Return sessions attendees who saved this session also saved."""
+        sess_key = self._sessionKey(request.websafeSessionKey)
+        row = ndb.Key(SessionRecommendations, RECOMMENDATIONS_ID,
+                      parent=sess_key).get()
+        return RecommendedSessionForms(items=[RecommendedSessionForm(
+            websafeKey=n['websafeKey'], name=n['name'], speaker=n['speaker'],
+            startDate=n['startDate'], score=n['count'])
+            for n in (row.neighbors if row else [])])
+
+# - - - Search - - - - - - - - - - - - - - - - - - - - - - -
+
+    @staticmethod
+    def _indexForSearch(entity):
+        """Refresh inverted index rows for a Conference or Session.
+
+        Postings are children of the indexed entity, so this can run
+        inside the transaction that writes it.
+        """
+        kind = entity.key.kind()
+        if kind == 'Conference':
+            fields = [(entity.name, 3.0), (entity.topics, 2.0),
+                      (entity.city, 1.0), (entity.description, 1.0)]
+        else:
+            fields = [(entity.name, 3.0), (entity.speaker, 2.0),
+                      (entity.topics, 2.0), (entity.highlights, 1.5),
+                      (entity.description, 1.0)]
+        weights = weighTokens(fields)
+
+        # drop postings for tokens the entity no longer contains
+        doc_key = ndb.Key(SearchDocument, SEARCH_DOCUMENT_ID, parent=entity.key)
+        doc = doc_key.get()
+        if doc:
+            ndb.delete_multi([ndb.Key(SearchPosting, token, parent=entity.key)
+                              for token in doc.tokens if token not in weights])
+
+        postings = [SearchPosting(id=token, parent=entity.key, token=token,
+                                  kind=kind, weight=weight)
+                    for token, weight in weights.items()]
+        ndb.put_multi(postings + [SearchDocument(key=doc_key,
+                                                 tokens=sorted(weights))])
+
+
+    def _searchIndex(self, request, kind):
+        """Return ranked page of matching keys & token for the next page."""
+        tokens = list(set(tokenize(request.query)))[:SEARCH_MAX_QUERY_TOKENS]
+        if not tokens:
+            raise endpoints.BadRequestException("Search 'query' field required")
+        limit = min(request.limit or SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE)
+        try:
+            offset = int(request.pageToken or 0)
+        except ValueError:
+            raise endpoints.BadRequestException("Invalid 'pageToken'.")
+
+        # look up the postings of every term in parallel, heaviest first
+        # (ties in key order) so that the cut-off drops the weakest
+        # matches & every page ranks the same postings
+        queries = dict((token, SearchPosting.query(
+            SearchPosting.token == token,
+            SearchPosting.kind == kind)) for token in tokens)
+        futures = dict((token, q.order(-SearchPosting.weight)
+                        .fetch_async(SEARCH_MAX_POSTINGS))
+                       for token, q in queries.items())
+        counts = dict((token, q.count_async(SEARCH_MAX_COUNT))
+                      for token, q in queries.items())
+        postings = dict(
+            (token, [(p.key.parent(), p.weight) for p in future.get_result()])
+            for token, future in futures.items())
+
+        ranked = rankDocuments(postings, len(tokens), dict(
+            (token, future.get_result()) for token, future in counts.items()))
+        page = [key for key, score in ranked[offset:offset + limit]]
+        more = len(ranked) > offset + limit
+        return page, str(offset + limit) if more else None
+
+    @endpoints.method(SEARCH_REQUEST, ConferenceForms,
+                      path='search/conferences',
+                      http_method='GET', name='searchConferences')
+    def searchConferences(self, request):
+        """Search conferences by words in their name, description & topics."""
+        keys, next_token = self._searchIndex(request, 'Conference')
+        conferences = [conf for conf in ndb.get_multi(keys) if conf]
+        return self._copyConferencesToForms(conferences, next_token)
+
+    @endpoints.method(SEARCH_REQUEST, SessionForms,
+                      path='search/sessions',
+                      http_method='GET', name='searchSessions')
+    def searchSessions(self, request):
+        """Search sessions by words in their name, speaker, topics & highlights."""
+        keys, next_token = self._searchIndex(request, 'Session')
+        return SessionForms(
+            items=[self._copySessionToForm(sess)
+                   for sess in ndb.get_multi(keys) if sess],
+            nextPageToken=next_token
+        )
+
 # - - - Featured Speaker - - - - - - - - - - - - - -
 
     @staticmethod
-    def _cacheFeaturedSpeaker(speaker, websafeConferenceKey):
+    def _recomputeFeaturedSpeakers(marks):
+        """Coalesced job: designate featured speakers of dirty conferences."""
+        for websafeConferenceKey, speakers in marks:
+            try:
+                ConferenceApi._cacheFeaturedSpeaker(speakers,
+                                                    websafeConferenceKey)
+            except endpoints.NotFoundException:
+                logging.info('Conference %s is gone', websafeConferenceKey)
+
+    @staticmethod
+    def _cacheFeaturedSpeaker(speakers, websafeConferenceKey):
         """
-        Designate featured speaker & assign to memcache.
+        Designate featured speaker of a conference, store it & assign
+        to memcache. Given several speakers of recently added or deleted
+        sessions, the last one that qualifies wins; if none does, the
+        current featured speaker is kept while they still qualify, and
+        dropped otherwise.
         """
-        speakerSessionsCount = 0
+        if not isinstance(speakers, list):
+            speakers = [speakers]
         speakerListedSessions = []
 
         # use the user-provided string to retrieve target conference
@@ -887,28 +2973,164 @@ class ConferenceApi(remote.Service):
                 'The conference you requested does not exist.')
 
         # create ancestor query for all key matches for this conference
-        sessions = Session.query(
-            ancestor=ndb.Key(Conference, websafeConferenceKey)).fetch()
-
-        # get total sessions our speaker is found in for this conference
-        for session in sessions:
-            if session.speaker == speaker:
-                speakerSessionsCount += 1
-                speakerListedSessions.append(session.name)
+        sessions = ConferenceApi._conferenceSessions(conf.key)
+
+        # get sessions each speaker is found in for this conference
+        for speaker in reversed(speakers):
+            speakerListedSessions = [session.name for session in sessions
+                                     if session.speaker == speaker]
+            if len(speakerListedSessions) >= 2:
+                break
+
+        if len(speakerListedSessions) < 2:
+            # no new one; check the current one still has enough sessions
+            fs = ndb.Key(FeaturedSpeaker, FEATURED_SPEAKER_ID,
+                         parent=conf.key).get()
+            if not fs:
+                return
+            speaker = fs.speaker
+            speakerListedSessions = [session.name for session in sessions
+                                     if session.speaker == speaker]
+            if speakerListedSessions == fs.sessionNames:
+                return
+            if len(speakerListedSessions) < 2:
+                fs.key.delete()
+                ConferenceApi._changeStats(conf.key, featuredSpeaker='')
+                memcache.delete(MEMCACHE_CONF_FEATURED_SPEAKER_TPL %
+                                conf.key.urlsafe())
+                if FEATURED_SPEAKER_CACHE.get()[0] == fs.message:
+                    FEATURED_SPEAKER_CACHE.set("")
+                return
 
         # if speaker has at least two sessions, this new featured speaker
-        if speakerSessionsCount >= 2:
+        if len(speakerListedSessions) >= 2:
             featuredSpeaker = SPEAKER_TPL % speaker
             featuredSpeaker += ', '.join(speakerListedSessions)
-            memcache.set(MEMCACHE_FEATURED_SPEAKER_KEY, featuredSpeaker)
+            fs = FeaturedSpeaker(id=FEATURED_SPEAKER_ID, parent=conf.key,
+                                 speaker=speaker,
+                                 sessionNames=speakerListedSessions,
+                                 message=featuredSpeaker)
+            fs.put()
+            ConferenceApi._changeStats(conf.key, featuredSpeaker=speaker)
+            memcache.set(MEMCACHE_CONF_FEATURED_SPEAKER_TPL % conf.key.urlsafe(),
+                         ConferenceApi._featuredSpeakerEntry(fs))
+            FEATURED_SPEAKER_CACHE.set(featuredSpeaker)
+
+    @staticmethod
+    def _featuredSpeakerEntry(fs):
+        """Return memcache entry for a FeaturedSpeaker ({} for none)."""
+        if not fs:
+            return {}
+        return {'speaker': fs.speaker, 'sessionNames': fs.sessionNames,
+                'message': fs.message}
+
+    @staticmethod
+    def _getFeaturedSpeakers(conf_keys):
+        """Return {Conference key: featured speaker entry} for many
+        conferences with one memcache & at most one datastore batch get."""
+        mc_keys = dict((MEMCACHE_CONF_FEATURED_SPEAKER_TPL % key.urlsafe(), key)
+                       for key in conf_keys)
+        entries = dict((mc_keys[mc_key], entry) for mc_key, entry in
+                       memcache.get_multi(list(mc_keys)).items())
+
+        missing = [key for key in mc_keys.values() if key not in entries]
+        if missing:
+            stored = ndb.get_multi([
+                ndb.Key(FeaturedSpeaker, FEATURED_SPEAKER_ID, parent=key)
+                for key in missing])
+            found = dict((key, ConferenceApi._featuredSpeakerEntry(fs))
+                         for key, fs in zip(missing, stored))
+            # add, so an entry the featured speaker task set meanwhile
+            # isn't overwritten by what was read before it; conferences
+            # without one are cached too, as a short-lived empty entry
+            memcache.add_multi(dict(
+                (MEMCACHE_CONF_FEATURED_SPEAKER_TPL % key.urlsafe(), entry)
+                for key, entry in found.items() if entry))
+            memcache.add_multi(dict(
+                (MEMCACHE_CONF_FEATURED_SPEAKER_TPL % key.urlsafe(), entry)
+                for key, entry in found.items() if not entry),
+                time=FEATURED_SPEAKER_MISS_TTL)
+            entries.update(found)
+        return dict((key, entry) for key, entry in entries.items() if entry)
+
+    @endpoints.method(CONF_GET_REQUEST, StringMessage,
+                      path='conference/{websafeConferenceKey}/featuredSpeaker',
+                      http_method='GET', name='getConferenceFeaturedSpeaker')
+    def getConferenceFeaturedSpeaker(self, request):
+        """Return featured speaker of a conference."""
+        conf_key = ndb.Key(urlsafe=request.websafeConferenceKey)
+        entry = self._getFeaturedSpeakers([conf_key]).get(conf_key, {})
+        return StringMessage(data=entry.get('message') or "")
+
+    @endpoints.method(WebsafeKeysForm, FeaturedSpeakerForms,
+                      path='conferences/featuredSpeakers',
+                      http_method='POST', name='getFeaturedSpeakers')
+    def getFeaturedSpeakers(self, request):
+        """Return featured speakers of many conferences at once."""
+        if len(request.websafeKeys) > BATCH_GET_MAX_KEYS:
+            raise endpoints.BadRequestException(
+                'At most %d keys per request.' % BATCH_GET_MAX_KEYS)
+        try:
+            conf_keys = [ndb.Key(urlsafe=wsck) for wsck in request.websafeKeys]
+        except Exception:
+            raise endpoints.BadRequestException('Invalid websafe key.')
+        entries = self._getFeaturedSpeakers(conf_keys)
+        return FeaturedSpeakerForms(items=[
+            FeaturedSpeakerForm(websafeConferenceKey=key.urlsafe(), **entries[key])
+            for key in conf_keys if key in entries])
 
 
     @endpoints.method(message_types.VoidMessage, StringMessage,
                       path='sessions/getFeaturedSpeaker',
                       http_method='GET', name='getFeaturedSpeaker')
     def getFeaturedSpeaker(self, request):
-        """Return Announcement from memcache."""
-        return StringMessage(data=memcache.get(MEMCACHE_FEATURED_SPEAKER_KEY) or "")
-
-
+        """Return featured speaker from the featured speaker cache."""
+        return self._cachedStringMessage(FEATURED_SPEAKER_CACHE)
+
+
+coalescing.registerJob('featured_speaker',
+                       ConferenceApi._recomputeFeaturedSpeakers)
+coalescing.registerJob('announcement', ConferenceApi._cacheAnnouncement,
+                       usesMarks=False)
+coalescing.registerJob('facets', ConferenceApi._drainFacetDeltas,
+                       usesMarks=False)
+coalescing.registerJob('agendas', ConferenceApi._refreshAgendas)
+coalescing.registerJob('recommendations',
+                       ConferenceApi._applyRecommendationDeltas)
+coalescing.registerJob('conference_stats', ConferenceApi._applyStatsChanges,
+                       withIds=True)
+
+mapper.registerMapper('topics', Conference.query, ConferenceApi._reindexTopics,
+                      batch=True, sideEffects=True)
+mapper.registerMapper('search_conferences', Conference.query,
+                      ConferenceApi._indexForSearch, sideEffects=True)
+mapper.registerMapper('search_sessions', Session.query,
+                      ConferenceApi._indexForSearch, sideEffects=True)
+mapper.registerMapper('session_seats', Session.query,
+                      ConferenceApi._recountSessionSeats, batch=True)
+# month facet counters of conferences that move catch up with the
+# nightly facet rebuild
+mapper.registerMapper('conference_dates', Conference.query,
+                      ConferenceApi._backfillDates)
+mapper.registerMapper('session_dates', Session.query,
+                      ConferenceApi._backfillDates)
+mapper.registerMapper('conference_stats', Conference.query,
+                      ConferenceApi._rebuildStats, sideEffects=True)
+# run compact_wishlists once compact_session_keys is done, then
+# conference_stats to rekey the per-session counts
+mapper.registerMapper('compact_session_keys', Session.query,
+                      ConferenceApi._compactSessionKeys, batch=True,
+                      sideEffects=True)
+mapper.registerMapper('compact_wishlists', Profile.query,
+                      ConferenceApi._compactWishlists, batch=True,
+                      sideEffects=True)
+
+API_BUILD_STARTED = time.time()
 api = endpoints.api_server([ConferenceApi])  # register API
+
+STARTUP_TIMINGS = {
+    'import': API_BUILD_STARTED - IMPORT_STARTED,
+    'apiServer': time.time() - API_BUILD_STARTED,
+}
+logging.info('conference.py imported in %(import).3fs, '
+             'API server built in %(apiServer).3fs', STARTUP_TIMINGS)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+"""
+export.py -- Udacity conference server-side Python App Engine
+    nightly bulk export of conferences, sessions & profiles
+
+$Id$
+
+An export is a chain of tasks, each of which reads one batch of
+entities from where the previous one stopped and writes it out as a
+shard of gzipped newline-delimited JSON. The shard, the query cursor
+to resume from and the task for the next batch are committed in one
+transaction with the ExportJob manifest, through the mapper's job
+checkpoint, so a task that dies partway through is simply retried
+from the last checkpoint.
+
+The export walks each kind in key order while writes go on; it is a
+consistent snapshot of each entity, not of the datastore as a whole.
+
+"""
+
+import gzip
+import io
+import json
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+
+from google.appengine.ext import ndb
+
+import mapper
+from models import Conference
+from models import ExportJob
+from models import ExportShard
+from models import Profile
+from models import Session
+
+EXPORT_MODELS = (Conference, Session, Profile)
+EXPORT_QUEUE = 'export'
+BATCH_SIZE = 200
+# leaves room under the datastore's 1MB entity limit
+MAX_SHARD_BYTES = 900 * 1024
+SHARD_ID_TPL = '%05d-%s'
+# exports older than this are deleted with their shards
+EXPORT_RETENTION = timedelta(days=30)
+DELETE_BATCH = 500
+
+
+def start(jobId=None):
+    """Start the export named jobId (today's date by default); return
+    False if an export of that name was already started."""
+    job_key = ndb.Key(ExportJob, jobId or datetime.utcnow().strftime('%Y-%m-%d'))
+
+    @ndb.transactional()
+    def create():
+        if job_key.get():
+            return False
+        ExportJob(key=job_key,
+                  kinds=[model._get_kind() for model in EXPORT_MODELS]).put()
+        mapper.queueStep(job_key, '/tasks/export', EXPORT_QUEUE)
+        return True
+
+    return create()
+
+
+def step(jobId):
+    """Export the next batch of jobId & queue the step after it."""
+    job_key = ndb.Key(ExportJob, jobId)
+    job = job_key.get()
+    if not job or job.finished:
+        return
+    kind = job.kinds[job.kindIndex]
+    query = ndb.Query(kind=kind)
+    start_cursor = ndb.Cursor(urlsafe=job.cursor) if job.cursor else None
+
+    # halve the batch until its shard fits in a single entity
+    size = BATCH_SIZE
+    while True:
+        entities, next_cursor, more = query.fetch_page(
+            size, start_cursor=start_cursor)
+        data = _encode(entities)
+        if len(data) <= MAX_SHARD_BYTES or size == 1:
+            break
+        size //= 2
+
+    kindIndex, cursor, records = job.kindIndex, job.cursor, len(entities)
+    nextCursor = next_cursor.urlsafe() if more and next_cursor else None
+
+    def advance(current):
+        """Store the shard & move the job's checkpoint past it."""
+        if records:
+            ExportShard(id=SHARD_ID_TPL % (current.shards, kind),
+                        parent=job_key, kind=kind, records=records,
+                        data=data).put()
+            current.shards += 1
+            counts = dict(current.records or {})
+            counts[kind] = counts.get(kind, 0) + records
+            current.records = counts
+        if nextCursor:
+            current.cursor = nextCursor
+        else:
+            current.kindIndex += 1
+            current.cursor = None
+        return current.kindIndex < len(current.kinds)
+
+    mapper.checkpoint(
+        job_key,
+        lambda current: (current.kindIndex, current.cursor) == (kindIndex,
+                                                                cursor),
+        advance, '/tasks/export', EXPORT_QUEUE)
+
+
+def _encode(entities):
+    """Return entities as gzipped newline-delimited JSON records."""
+    buf = io.BytesIO()
+    out = gzip.GzipFile(fileobj=buf, mode='wb')
+    for entity in entities:
+        record = entity.to_dict()
+        record['key'] = entity.key.urlsafe()
+        out.write(json.dumps(record, default=_jsonValue, sort_keys=True)
+                  .encode('utf-8') + b'\n')
+    out.close()
+    return buf.getvalue()
+
+
+def _jsonValue(value):
+    """Serialize the property values json doesn't know about."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, ndb.Key):
+        return value.urlsafe()
+    raise TypeError('%r is not JSON serializable' % (value,))
+
+
+def expire():
+    """Delete the exports started before the retention window, shards
+    first so that a run that dies partway leaves the job to retry."""
+    cutoff = datetime.utcnow() - EXPORT_RETENTION
+    for job_key in ExportJob.query(ExportJob.started < cutoff).iter(
+            keys_only=True):
+        shards = ExportShard.query(ancestor=job_key)
+        while True:
+            keys = shards.fetch(DELETE_BATCH, keys_only=True)
+            if not keys:
+                break
+            ndb.delete_multi(keys)
+        job_key.delete()
+
+
+def manifest(jobId):
+    """Return the manifest of jobId as a dict, or None if there's none."""
+    job_key = ndb.Key(ExportJob, jobId)
+    job = job_key.get()
+    if not job:
+        return None
+    shard_keys = ExportShard.query(ancestor=job_key).fetch(keys_only=True)
+    return {
+        'job': jobId,
+        'started': job.started.isoformat(),
+        'finished': job.finished.isoformat() if job.finished else None,
+        'records': job.records or {},
+        'shards': [{'id': key.id(), 'kind': key.id().split('-', 1)[1]}
+                   for key in shard_keys],
+    }
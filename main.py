@@ -12,17 +12,69 @@ created by wesc on 2014 may 24
 
 __author__ = 'wesc+api@google.com (Wesley Chun)'
 
+import time
+IMPORT_STARTED = time.time()
+
+import json
+import logging
+
 import webapp2
-from google.appengine.api import app_identity
-from google.appengine.api import mail
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
+import admission
+import caching
+import coalescing
+import conference
+import mapper
 from conference import ConferenceApi
 
+class WarmupHandler(webapp2.RequestHandler):
+    def get(self):
+        """Prime caches before the instance takes user traffic."""
+        started = time.time()
+        primed = ConferenceApi._warmUp()
+        logging.info('Warmed up in %.3fs, %d conferences primed; '
+                     'main.py import %.3fs, conference.py %s',
+                     time.time() - started, primed, IMPORT_SECONDS,
+                     conference.STARTUP_TIMINGS)
+        self.response.set_status(200)
+
 class SetAnnouncementHandler(webapp2.RequestHandler):
     def get(self):
         """Set Announcement in Memcache."""
         ConferenceApi._cacheAnnouncement()
         self.response.set_status(204)
 
+class ExpireRequestOutcomesHandler(webapp2.RequestHandler):
+    def get(self):
+        """Delete request ID records too old to be replayed."""
+        ConferenceApi._expireRequestOutcomes()
+        self.response.set_status(204)
+
+class RebuildFacetsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Recount conference facets to repair counter drift."""
+        if not ConferenceApi._rebuildFacets():
+            # facet deltas are being applied; the cron retries later
+            logging.info('Facet counters busy; rebuild postponed')
+            self.response.set_status(503)
+            return
+        self.response.set_status(204)
+
+class RefreshCacheHandler(webapp2.RequestHandler):
+    def post(self):
+        """Rebuild a stale tiered cache value in the background."""
+        cache = caching.CACHES.get(self.request.get('name'))
+        if cache:
+            cache.refresh()
+        self.response.set_status(204)
+
+class CoalescedJobHandler(webapp2.RequestHandler):
+    def post(self):
+        """Run one coalesced background job over everything marked dirty."""
+        coalescing.process(self.request.get('job'))
+        self.response.set_status(204)
+
 class SetFeaturedSpeakerHandler(webapp2.RequestHandler):
     def post(self):
         """Set featured speaker in Memcache."""
@@ -35,6 +87,9 @@ class SetFeaturedSpeakerHandler(webapp2.RequestHandler):
 class SendConfirmationEmailHandler(webapp2.RequestHandler):
     def post(self):
         """Send email confirming Conference creation."""
+        # rarely used; keep them out of instance startup
+        from google.appengine.api import app_identity
+        from google.appengine.api import mail
         mail.send_mail(
             'noreply@%s.appspotmail.com' % (
                 app_identity.get_application_id()),     # from
@@ -45,9 +100,142 @@ class SendConfirmationEmailHandler(webapp2.RequestHandler):
                 'conferenceInfo')
         )
 
+class MapperStepHandler(webapp2.RequestHandler):
+    def post(self):
+        """Map one batch of a mapper job, then chain the next."""
+        mapper.step(int(self.request.get('job')))
+        self.response.set_status(204)
+
+class MapperHandler(webapp2.RequestHandler):
+    def get(self):
+        """Report registered mappers & progress of recent jobs."""
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(mapper.status()))
+
+    def post(self):
+        """Start a mapper job; dry_run=1 only counts what would change."""
+        try:
+            job_id = mapper.start(
+                self.request.get('name'),
+                dryRun=self.request.get('dry_run') in ('1', 'true'),
+                delay=float(self.request.get('delay') or 0))
+        except ValueError as e:
+            self.abort(400, detail=str(e))
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps({'job': job_id}))
+
+class PromoteWaitlistHandler(webapp2.RequestHandler):
+    def post(self):
+        """Register one batch of waitlisted users, then chain the next."""
+        wsck = self.request.get('websafeConferenceKey')
+        if ConferenceApi._promoteWaitlist(wsck):
+            taskqueue.add(params={'websafeConferenceKey': wsck},
+                          url='/tasks/promote_waitlist')
+        self.response.set_status(204)
+
+class CleanUpDeletedHandler(webapp2.RequestHandler):
+    def post(self):
+        """Clean up one batch after a deleted conference or session,
+        then chain the next."""
+        wsck = self.request.get('websafeConferenceKey')
+        wssk = self.request.get('websafeSessionKey')
+        if wsck:
+            more = ConferenceApi._cleanUpConference(wsck)
+            params = {'websafeConferenceKey': wsck}
+        else:
+            more = ConferenceApi._cleanUpSession(wssk)
+            params = {'websafeSessionKey': wssk}
+        if more:
+            ConferenceApi._queueCleanUp(**params)
+        self.response.set_status(204)
+
+class StartExportHandler(webapp2.RequestHandler):
+    def get(self):
+        """Start tonight's export of conferences, sessions & profiles."""
+        import export
+        if not export.start():
+            logging.info('Export already started today')
+        self.response.set_status(204)
+
+class ExpireExportsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Delete exports past their retention window."""
+        import export
+        export.expire()
+        self.response.set_status(204)
+
+class ExportStepHandler(webapp2.RequestHandler):
+    def post(self):
+        """Export one batch, then chain the next."""
+        import export
+        export.step(self.request.get('job'))
+        self.response.set_status(204)
+
+class ExportHandler(webapp2.RequestHandler):
+    def get(self):
+        """Return the manifest of an export, or one of its shards."""
+        import export
+        from models import ExportJob
+        from models import ExportShard
+        job = self.request.get('job')
+        shard_id = self.request.get('shard')
+        if shard_id:
+            shard = ndb.Key(ExportJob, job, ExportShard, shard_id).get()
+            if not shard:
+                self.abort(404)
+            self.response.headers['Content-Type'] = 'application/gzip'
+            self.response.headers['Content-Disposition'] = (
+                'attachment; filename="%s-%s.ndjson.gz"' % (job, shard_id))
+            self.response.write(shard.data)
+            return
+        manifest = export.manifest(job)
+        if not manifest:
+            self.abort(404)
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(manifest))
+
+class StartRecommendationsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Queue a full rebuild of session recommendations, per shard."""
+        ConferenceApi._startRecommendations()
+        self.response.set_status(204)
+
+class RebuildRecommendationsHandler(webapp2.RequestHandler):
+    def post(self):
+        """Count one stretch of profiles for the recommendations of the
+        sessions of one shard, storing them once all are counted."""
+        ConferenceApi._rebuildRecommendations(
+            self.request.get('build'), int(self.request.get('shard')),
+            int(self.request.get('shards')))
+        self.response.set_status(204)
+
+class AdmissionStatsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Report admission control limits & admitted/shed counts."""
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(admission.stats()))
+
 
 app = webapp2.WSGIApplication([
+    ('/_ah/warmup', WarmupHandler),
     ('/crons/set_announcement', SetAnnouncementHandler),
+    ('/crons/rebuild_facets', RebuildFacetsHandler),
+    ('/crons/expire_request_outcomes', ExpireRequestOutcomesHandler),
+    ('/crons/start_export', StartExportHandler),
+    ('/crons/expire_exports', ExpireExportsHandler),
+    ('/crons/rebuild_recommendations', StartRecommendationsHandler),
     ('/tasks/send_confirmation_email', SendConfirmationEmailHandler),
     ('/tasks/set_featured_speaker', SetFeaturedSpeakerHandler),
+    ('/tasks/refresh_cache', RefreshCacheHandler),
+    ('/tasks/coalesced', CoalescedJobHandler),
+    ('/tasks/mapper', MapperStepHandler),
+    ('/tasks/promote_waitlist', PromoteWaitlistHandler),
+    ('/tasks/clean_up_deleted', CleanUpDeletedHandler),
+    ('/tasks/export', ExportStepHandler),
+    ('/tasks/rebuild_recommendations', RebuildRecommendationsHandler),
+    ('/admin/admission_stats', AdmissionStatsHandler),
+    ('/admin/export', ExportHandler),
+    ('/admin/mapper', MapperHandler),
 ], debug=True)
+
+IMPORT_SECONDS = time.time() - IMPORT_STARTED
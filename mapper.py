@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+
+"""
+mapper.py -- Udacity conference server-side Python App Engine
+    cursor-chained background migrations & backfills over whole kinds
+
+$Id$
+
+A mapper is a query plus a function applied to every entity it
+returns, one batch per task. The batch is read outside any
+transaction & may be stale, so it only picks the entities to change:
+the function is applied to each of them once, to its current state,
+in an xg transaction of its own, so that a mapper never writes back
+over a concurrent write. Functions with side effects can't be tried
+out on a stale copy, so every entity of their batches goes through
+the transaction. The task then checkpoints the query cursor & its
+progress on the MapperJob and queues the next batch in the same
+transaction. A task that dies before its checkpoint reruns its batch,
+so mapper functions must be safe to apply twice; queries they run
+other than ancestor queries must be non-transactional.
+
+checkpoint() & queueStep() chain any job kept as an entity with a
+cursor & a finished stamp this way; the export uses them too.
+
+"""
+
+import logging
+from datetime import datetime
+
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
+
+from models import MapperJob
+
+MAPPER_QUEUE = 'mapper'
+BATCH_SIZE = 100
+
+MAPPERS = {}
+
+
+class Mapper(object):
+    """Mapper -- a registered migration: query factory, function &
+    how to apply it"""
+
+    def __init__(self, name, query, func, batch=False, batchSize=BATCH_SIZE,
+                 sideEffects=False):
+        self.name = name
+        self.query = query
+        self.func = func
+        self.batch = batch
+        self.batchSize = batchSize
+        self.sideEffects = sideEffects
+
+    def apply(self, entities):
+        """Return the entities the function changed."""
+        if self.batch:
+            return list(self.func(entities) or [])
+        return [entity for entity in entities if self.func(entity)]
+
+
+def registerMapper(name, query, func, batch=False, batchSize=BATCH_SIZE,
+                   sideEffects=False):
+    """Register a mapper over the entities returned by query().
+
+    func(entity) returns True if it changed entity, or with batch=True
+    func(entities) returns the list of entities it changed; either way
+    the mapper writes them. Functions that write anything else must be
+    registered with sideEffects=True, which rules out dry runs.
+    """
+    MAPPERS[name] = Mapper(name, query, func, batch, batchSize, sideEffects)
+
+
+def start(name, dryRun=False, delay=0):
+    """Start a run of mapper name, pausing delay seconds between
+    batches; return the id of its MapperJob."""
+    mapper = MAPPERS.get(name)
+    if not mapper:
+        raise ValueError('No mapper named %r' % name)
+    if dryRun and mapper.sideEffects:
+        raise ValueError('Mapper %r writes as it goes; it has no dry run'
+                         % name)
+
+    @ndb.transactional()
+    def create():
+        job = MapperJob(name=name, dryRun=dryRun, delay=float(delay))
+        job.put()
+        queueStep(job.key, '/tasks/mapper', MAPPER_QUEUE, job.delay)
+        return job.key.id()
+
+    return create()
+
+
+def step(jobId):
+    """Map the next batch of the job & queue the batch after it."""
+    job_key = ndb.Key(MapperJob, jobId)
+    job = job_key.get()
+    if not job or job.finished:
+        return
+    mapper = MAPPERS.get(job.name)
+    if not mapper:
+        logging.error('Mapper %s of job %s is gone', job.name, jobId)
+        return
+    cursor = job.cursor
+    start_cursor = ndb.Cursor(urlsafe=cursor) if cursor else None
+    if mapper.sideEffects:
+        keys, next_cursor, more = mapper.query().fetch_page(
+            mapper.batchSize, start_cursor=start_cursor, keys_only=True)
+        processed = len(keys)
+    else:
+        entities, next_cursor, more = mapper.query().fetch_page(
+            mapper.batchSize, start_cursor=start_cursor)
+        keys = [entity.key for entity in mapper.apply(entities)]
+        processed = len(entities)
+    if not job.dryRun:
+        keys = [key for key in keys if _applyCurrent(mapper, key)]
+    nextCursor = next_cursor.urlsafe() if more and next_cursor else None
+
+    def advance(current):
+        current.processed += processed
+        current.changed += len(keys)
+        current.cursor = nextCursor
+        return bool(nextCursor)
+
+    job = checkpoint(job_key, lambda current: current.cursor == cursor,
+                     advance, '/tasks/mapper', MAPPER_QUEUE, job.delay)
+    if job and job.finished:
+        logging.info('Mapper %s %sfinished: %d processed, %d changed',
+                     job.name, 'dry run ' if job.dryRun else '',
+                     job.processed, job.changed)
+
+
+@ndb.transactional(xg=True)
+def _applyCurrent(mapper, key):
+    """Apply the mapper to the current state of the entity at key &
+    write it if it changed; return True if it did."""
+    entity = key.get()
+    changed = mapper.apply([entity]) if entity else []
+    ndb.put_multi(changed)
+    return bool(changed)
+
+
+@ndb.transactional()
+def checkpoint(job_key, isAt, advance, url, queueName, countdown=0):
+    """Move a cursor-chained job past one step & queue the next.
+
+    isAt(job) tells whether the job is still where the step started;
+    a retry of a step that did commit finds it moved on, and does
+    nothing. Otherwise advance(job) records the step on the job &
+    returns whether there is more to do; the job is written in one
+    transaction with the task for its next step, or stamped finished.
+    Return the job, or None for such a retry.
+    """
+    job = job_key.get()
+    if not job or job.finished or not isAt(job):
+        return None
+    if advance(job):
+        queueStep(job_key, url, queueName, countdown)
+    else:
+        job.finished = datetime.utcnow()
+    job.put()
+    return job
+
+
+def queueStep(job_key, url, queueName, countdown=0):
+    """Queue the next step of a job with the current transaction."""
+    taskqueue.add(params={'job': job_key.id()}, url=url,
+                  queue_name=queueName, countdown=countdown,
+                  transactional=True)
+
+
+def status(limit=20):
+    """Return registered mapper names & progress of the latest jobs."""
+    jobs = MapperJob.query().order(-MapperJob.started).fetch(limit)
+    return {
+        'mappers': sorted(MAPPERS),
+        'jobs': [{
+            'id': job.key.id(),
+            'name': job.name,
+            'dryRun': job.dryRun,
+            'processed': job.processed,
+            'changed': job.changed,
+            'started': job.started.isoformat(),
+            'finished': job.finished.isoformat() if job.finished else None,
+        } for job in jobs],
+    }
@@ -22,6 +22,16 @@ class ConflictException(endpoints.ServiceException):
     """ConflictException -- exception mapped to HTTP 409 response"""
     http_status = httplib.CONFLICT
 
+class NotModifiedException(endpoints.ServiceException):
+    """NotModifiedException -- exception mapped to HTTP 304 response;
+    Endpoints v1 can't set response headers, so ETags travel in the
+    response message and the 304 still carries an error body"""
+    http_status = httplib.NOT_MODIFIED
+
+class ServiceUnavailableException(endpoints.ServiceException):
+    """ServiceUnavailableException -- exception mapped to HTTP 503 response"""
+    http_status = httplib.SERVICE_UNAVAILABLE
+
 class Profile(ndb.Model):
     """Profile -- User profile object"""
     displayName = ndb.StringProperty()
@@ -30,6 +40,20 @@ class Profile(ndb.Model):
     conferenceKeysToAttend = ndb.StringProperty(repeated=True)
     wishList = ndb.StringProperty(repeated=True)
 
+class Agenda(ndb.Model):
+    """Agenda -- registered conferences & wishlisted sessions of the
+    parent Profile, sorted by date, with overlapping dates flagged"""
+    items = ndb.JsonProperty()
+    updated = ndb.DateTimeProperty(auto_now=True)
+
+class RequestOutcome(ndb.Model):
+    """RequestOutcome -- result of a write a client tagged with a request
+    ID, keyed by that ID under the client's Profile"""
+    operation = ndb.StringProperty(indexed=False)
+    target = ndb.StringProperty(indexed=False)
+    outcome = ndb.BooleanProperty(indexed=False)
+    created = ndb.DateTimeProperty(auto_now_add=True)
+
 class ProfileMiniForm(messages.Message):
     """ProfileMiniForm -- update Profile form message"""
     displayName = messages.StringField(1)
@@ -42,10 +66,16 @@ class ProfileForm(messages.Message):
     teeShirtSize = messages.EnumField('TeeShirtSize', 3)
     conferenceKeysToAttend = messages.StringField(4, repeated=True)
     wishList = messages.StringField(5, repeated=True)
+    etag = messages.StringField(6)
 
 class StringMessage(messages.Message):
     """StringMessage-- outbound (single) string message"""
     data = messages.StringField(1, required=True)
+    etag = messages.StringField(2)
+
+class WebsafeKeysForm(messages.Message):
+    """WebsafeKeysForm -- inbound list of websafe keys"""
+    websafeKeys = messages.StringField(1, repeated=True)
 
 class BooleanMessage(messages.Message):
     """BooleanMessage-- outbound Boolean value message"""
@@ -56,14 +86,85 @@ class Conference(ndb.Model):
     name            = ndb.StringProperty(required=True)
     description     = ndb.StringProperty()
     organizerUserId = ndb.StringProperty()
-    topics          = ndb.StringProperty(repeated=True)
+    # topics are filtered through TopicMembership rather than indexed here,
+    # so that each write doesn't fan out over every composite index
+    topics          = ndb.StringProperty(repeated=True, indexed=False)
+    topicIds        = ndb.StringProperty(repeated=True, indexed=False)
     city            = ndb.StringProperty()
     startDate       = ndb.DateProperty()
-    month           = ndb.IntegerProperty() # TODO: do we need for indexing like Java?
+    # calendar month alone (1-12, 0 without a startDate) for the MONTH
+    # query filter & facet; timeline scans use the buckets below, which
+    # carry the year: ISO year * 100 + ISO week, and year * 100 + month
+    month           = ndb.IntegerProperty()
+    weekBucket      = ndb.IntegerProperty()
+    monthBucket     = ndb.IntegerProperty()
     endDate         = ndb.DateProperty()
     maxAttendees    = ndb.IntegerProperty()
     seatsAvailable  = ndb.IntegerProperty()
 
+class Topic(ndb.Model):
+    """Topic -- topic dictionary entry, keyed by normalized topic id"""
+    name            = ndb.StringProperty(required=True, indexed=False)
+
+class TopicMembership(ndb.Model):
+    """TopicMembership -- topic index row, keyed by topic id under the
+    Conference it belongs to"""
+    topicId         = ndb.StringProperty(required=True)
+
+class WaitlistEntry(ndb.Model):
+    """WaitlistEntry -- user waiting for a seat, keyed by user ID under
+    the Conference they are waiting for"""
+    joined          = ndb.DateTimeProperty(auto_now_add=True)
+
+class FeaturedSpeaker(ndb.Model):
+    """FeaturedSpeaker -- featured speaker of the parent Conference"""
+    speaker         = ndb.StringProperty(indexed=False)
+    sessionNames    = ndb.StringProperty(repeated=True, indexed=False)
+    message         = ndb.StringProperty(indexed=False)
+
+class DirtyMark(ndb.Model):
+    """DirtyMark -- one change to a target waiting for a coalesced
+    background recompute"""
+    job             = ndb.StringProperty(required=True)
+    target          = ndb.StringProperty(required=True, indexed=False)
+    payload         = ndb.JsonProperty()
+    marked          = ndb.DateTimeProperty(auto_now_add=True)
+
+class CacheEntry(ndb.Model):
+    """CacheEntry -- durable copy of a tiered cache value, keyed by name"""
+    value           = ndb.JsonProperty()
+    updated         = ndb.FloatProperty(indexed=False)
+    changed         = ndb.FloatProperty(indexed=False)
+
+class ExportJob(ndb.Model):
+    """ExportJob -- manifest & checkpoint of one bulk export, keyed by
+    its date; the exported records are in its ExportShard children"""
+    started         = ndb.DateTimeProperty(auto_now_add=True)
+    finished        = ndb.DateTimeProperty()
+    kinds           = ndb.StringProperty(repeated=True, indexed=False)
+    kindIndex       = ndb.IntegerProperty(default=0, indexed=False)
+    cursor          = ndb.StringProperty(indexed=False)
+    shards          = ndb.IntegerProperty(default=0, indexed=False)
+    records         = ndb.JsonProperty()
+
+class ExportShard(ndb.Model):
+    """ExportShard -- gzipped newline-delimited JSON records of one
+    kind, keyed by sequence number under its ExportJob"""
+    kind            = ndb.StringProperty(required=True)
+    records         = ndb.IntegerProperty(indexed=False)
+    data            = ndb.BlobProperty()
+
+class MapperJob(ndb.Model):
+    """MapperJob -- progress & checkpoint of one run of a mapper"""
+    name            = ndb.StringProperty(required=True)
+    dryRun          = ndb.BooleanProperty(default=False, indexed=False)
+    delay           = ndb.FloatProperty(default=0.0, indexed=False)
+    cursor          = ndb.StringProperty(indexed=False)
+    processed       = ndb.IntegerProperty(default=0, indexed=False)
+    changed         = ndb.IntegerProperty(default=0, indexed=False)
+    started         = ndb.DateTimeProperty(auto_now_add=True)
+    finished        = ndb.DateTimeProperty()
+
 class ConferenceForm(messages.Message):
     """ConferenceForm -- Conference outbound form message"""
     name            = messages.StringField(1)
@@ -78,10 +179,53 @@ class ConferenceForm(messages.Message):
     endDate         = messages.StringField(10) #DateTimeField()
     websafeKey      = messages.StringField(11)
     organizerDisplayName = messages.StringField(12)
+    etag            = messages.StringField(13)
 
 class ConferenceForms(messages.Message):
     """ConferenceForms -- multiple Conference outbound form message"""
     items = messages.MessageField(ConferenceForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
+    missingKeys = messages.StringField(3, repeated=True)
+
+class ConferenceSummaryForm(messages.Message):
+    """ConferenceSummaryForm -- compact Conference outbound listing message"""
+    name            = messages.StringField(1)
+    city            = messages.StringField(2)
+    startDate       = messages.StringField(3) #DateTimeField()
+    endDate         = messages.StringField(4) #DateTimeField()
+    seatsAvailable  = messages.IntegerField(5, variant=messages.Variant.INT32)
+    websafeKey      = messages.StringField(6)
+
+class ConferenceSummaryForms(messages.Message):
+    """ConferenceSummaryForms -- multiple ConferenceSummaryForm outbound message"""
+    items = messages.MessageField(ConferenceSummaryForm, 1, repeated=True)
+
+class FeaturedSpeakerForm(messages.Message):
+    """FeaturedSpeakerForm -- featured speaker of one Conference outbound
+    form message"""
+    websafeConferenceKey = messages.StringField(1)
+    speaker         = messages.StringField(2)
+    sessionNames    = messages.StringField(3, repeated=True)
+    message         = messages.StringField(4)
+
+class FeaturedSpeakerForms(messages.Message):
+    """FeaturedSpeakerForms -- multiple FeaturedSpeakerForm outbound message"""
+    items = messages.MessageField(FeaturedSpeakerForm, 1, repeated=True)
+
+class AgendaItemForm(messages.Message):
+    """AgendaItemForm -- conference or session on a user's agenda"""
+    kind            = messages.StringField(1)
+    websafeKey      = messages.StringField(2)
+    name            = messages.StringField(3)
+    city            = messages.StringField(4)
+    startDate       = messages.StringField(5) #DateTimeField()
+    endDate         = messages.StringField(6) #DateTimeField()
+    overlaps        = messages.BooleanField(7)
+    overlapsWith    = messages.StringField(8, repeated=True)
+
+class AgendaForm(messages.Message):
+    """AgendaForm -- user's agenda outbound message"""
+    items = messages.MessageField(AgendaItemForm, 1, repeated=True)
 
 class TeeShirtSize(messages.Enum):
     """TeeShirtSize -- t-shirt size enumeration value"""
@@ -112,7 +256,8 @@ class ConferenceQueryForms(messages.Message):
     filters = messages.MessageField(ConferenceQueryForm, 1, repeated=True)
 
 class Speaker(ndb.Model):
-    """Speaker -- Speaker object."""
+    """Speaker -- Speaker object, keyed by normalized email; sessions
+    point at it through Session.speakerKey"""
     name = ndb.StringProperty(required=True)
     mainEmail = ndb.StringProperty(required=True)
 
@@ -120,6 +265,9 @@ class Session(ndb.Model):
     """session -- Session object"""
     name            = ndb.StringProperty(required=True)
     speaker         = ndb.StringProperty(required=True)
+    # the speaker's sessions across conferences are found through
+    # this property's index
+    speakerKey      = ndb.KeyProperty(kind='Speaker')
     description     = ndb.StringProperty()
     sessionType     = ndb.StringProperty()
     organizerUserId = ndb.StringProperty()
@@ -128,7 +276,10 @@ class Session(ndb.Model):
     highlights      = ndb.StringProperty(repeated=True)
     startDate       = ndb.DateProperty()
     duration        = ndb.IntegerProperty()    
-    month           = ndb.IntegerProperty() # TODO: do we need for indexing like Java?
+    # same meaning as on Conference
+    month           = ndb.IntegerProperty()
+    weekBucket      = ndb.IntegerProperty()
+    monthBucket     = ndb.IntegerProperty()
     maxAttendees    = ndb.IntegerProperty()
     seatsAvailable  = ndb.IntegerProperty()
     endDate         = ndb.DateProperty()    
@@ -151,15 +302,145 @@ class SessionForm(messages.Message):
     endDate         = messages.StringField(14) #DateTimeField()
     websafeKey      = messages.StringField(15, required=True)
     organizerDisplayName = messages.StringField(16)
+    speakerEmail    = messages.StringField(17)
 
 class SessionForms(messages.Message):
     """ConferenceForms -- multiple Conference outbound form message"""
     items = messages.MessageField(SessionForm, 1, repeated=True)
+    etag = messages.StringField(2)
+    nextPageToken = messages.StringField(3)
+    missingKeys = messages.StringField(4, repeated=True)
+
+class SpeakerForm(messages.Message):
+    """SpeakerForm -- Speaker outbound form message"""
+    name            = messages.StringField(1)
+    mainEmail       = messages.StringField(2)
+    sessions        = messages.MessageField(SessionForm, 3, repeated=True)
+
+class SessionSummaryForm(messages.Message):
+    """SessionSummaryForm -- compact Session outbound listing message"""
+    name            = messages.StringField(1)
+    city            = messages.StringField(2)
+    startDate       = messages.StringField(3) #DateTimeField()
+    endDate         = messages.StringField(4) #DateTimeField()
+    seatsAvailable  = messages.IntegerField(5, variant=messages.Variant.INT32)
+    websafeKey      = messages.StringField(6)
+
+class SessionSummaryForms(messages.Message):
+    """SessionSummaryForms -- multiple SessionSummaryForm outbound message"""
+    items = messages.MessageField(SessionSummaryForm, 1, repeated=True)
+
+class SessionKeyMove(ndb.Model):
+    """SessionKeyMove -- client id of a Session moved off its old
+    pseudo-conference parent, keyed by its old websafe key"""
+    sessionId       = ndb.StringProperty(indexed=False)
+
+class RecommendationBuild(ndb.Model):
+    """RecommendationBuild -- checkpoint of the nightly recount of one
+    shard of session recommendations; the counts so far are in its
+    RecommendationCounts children"""
+    started         = ndb.DateTimeProperty(auto_now_add=True)
+    finished        = ndb.DateTimeProperty()
+    cursor          = ndb.StringProperty(indexed=False)
+    generation      = ndb.IntegerProperty(default=0, indexed=False)
+    chunks          = ndb.IntegerProperty(default=0, indexed=False)
+
+class RecommendationCounts(ndb.Model):
+    """RecommendationCounts -- one chunk of the compressed neighbor
+    counts of a RecommendationBuild, keyed by generation & chunk number"""
+    data            = ndb.BlobProperty()
+
+class SessionRecommendations(ndb.Model):
+    """SessionRecommendations -- sessions most often wishlisted along
+    with the parent Session, best first"""
+    neighbors       = ndb.JsonProperty()
+    updated         = ndb.DateTimeProperty(auto_now=True)
+
+class RecommendedSessionForm(messages.Message):
+    """RecommendedSessionForm -- session wishlisted along with another"""
+    websafeKey      = messages.StringField(1)
+    name            = messages.StringField(2)
+    speaker         = messages.StringField(3)
+    startDate       = messages.StringField(4) #DateTimeField()
+    score           = messages.IntegerField(5, variant=messages.Variant.INT32)
+
+class RecommendedSessionForms(messages.Message):
+    """RecommendedSessionForms -- multiple RecommendedSessionForm outbound message"""
+    items = messages.MessageField(RecommendedSessionForm, 1, repeated=True)
+
+class SearchPosting(ndb.Model):
+    """SearchPosting -- inverted index row, keyed by token under the
+    Conference or Session it points at"""
+    token           = ndb.StringProperty(required=True)
+    kind            = ndb.StringProperty(required=True)
+    weight          = ndb.FloatProperty()
+
+class SearchDocument(ndb.Model):
+    """SearchDocument -- tokens currently posted for its parent entity"""
+    tokens          = ndb.StringProperty(repeated=True, indexed=False)
+
+class ConferenceStats(ndb.Model):
+    """ConferenceStats -- organizer dashboard rollup of the parent
+    Conference; sessions maps session websafe keys to their name &
+    wishlist count"""
+    name            = ndb.StringProperty(indexed=False)
+    startDate       = ndb.DateProperty(indexed=False)
+    maxAttendees    = ndb.IntegerProperty(indexed=False)
+    seatsAvailable  = ndb.IntegerProperty(indexed=False)
+    registrations   = ndb.IntegerProperty(default=0, indexed=False)
+    sessions        = ndb.JsonProperty()
+    featuredSpeaker = ndb.StringProperty(indexed=False)
+    # ids of the latest marks applied, so that a retried batch skips them
+    applied         = ndb.StringProperty(repeated=True, indexed=False)
+    updated         = ndb.DateTimeProperty(auto_now=True)
+
+class SessionStatsForm(messages.Message):
+    """SessionStatsForm -- wishlist count of one session"""
+    websafeKey      = messages.StringField(1)
+    name            = messages.StringField(2)
+    wishlists       = messages.IntegerField(3, variant=messages.Variant.INT32)
+
+class ConferenceStatsForm(messages.Message):
+    """ConferenceStatsForm -- organizer dashboard entry of a Conference"""
+    websafeConferenceKey = messages.StringField(1)
+    name            = messages.StringField(2)
+    startDate       = messages.StringField(3) #DateTimeField()
+    maxAttendees    = messages.IntegerField(4, variant=messages.Variant.INT32)
+    seatsAvailable  = messages.IntegerField(5, variant=messages.Variant.INT32)
+    registrations   = messages.IntegerField(6, variant=messages.Variant.INT32)
+    fillRate        = messages.FloatField(7)
+    sessionCount    = messages.IntegerField(8, variant=messages.Variant.INT32)
+    sessions        = messages.MessageField(SessionStatsForm, 9, repeated=True)
+    featuredSpeaker = messages.StringField(10)
+
+class ConferenceStatsForms(messages.Message):
+    """ConferenceStatsForms -- organizer dashboard outbound message"""
+    items = messages.MessageField(ConferenceStatsForm, 1, repeated=True)
+
+class FacetCount(ndb.Model):
+    """FacetCount -- number of conferences (in total & with seats left)
+    for one city, topic or month value"""
+    facet           = ndb.StringProperty(required=True)
+    value           = ndb.StringProperty(required=True)
+    count           = ndb.IntegerProperty(default=0, indexed=False)
+    available       = ndb.IntegerProperty(default=0, indexed=False)
+    # ids of the latest delta batches applied, so that replays skip
+    applied         = ndb.StringProperty(repeated=True, indexed=False)
+
+class FacetDeltaBatch(ndb.Model):
+    """FacetDeltaBatch -- summed facet counter changes of some leased
+    pull tasks, kept until they are applied & the tasks deleted"""
+    deltas          = ndb.JsonProperty()
+    tasks           = ndb.StringProperty(repeated=True, indexed=False)
 
+class FacetValueForm(messages.Message):
+    """FacetValueForm -- outbound count for a single facet value"""
+    value           = messages.StringField(1)
+    count           = messages.IntegerField(2, variant=messages.Variant.INT32)
+    available       = messages.IntegerField(3, variant=messages.Variant.INT32)
 
-#class SpeakerForm(messages.Message):
-#    """SpeakerForm -- form for transmittal of object information."""
-#    name = messages.StringField(1, required=True)
-#    mainEmail = messages.StringField(2, required=True)
-#    sessionsToSpeakAt = messages.StringField(3, repeated=True)
- 
\ No newline at end of file
+class ConferenceFacetsForm(messages.Message):
+    """ConferenceFacetsForm -- outbound conference counts per filter value"""
+    cities = messages.MessageField(FacetValueForm, 1, repeated=True)
+    topics = messages.MessageField(FacetValueForm, 2, repeated=True)
+    months = messages.MessageField(FacetValueForm, 3, repeated=True)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+"""
+recommendations.py -- Udacity conference server-side Python App Engine
+    wishlist co-occurrence counting for session recommendations
+
+$Id$
+
+Plain Python with no App Engine imports, so that it can be exercised
+on synthetic data off the server; see recommendations_bench.py.
+
+"""
+
+import hashlib
+
+
+def inShard(item, shard, shards):
+    """Return True if item belongs to shard out of shards."""
+    if shards <= 1:
+        return True
+    if not isinstance(item, bytes):
+        item = item.encode('utf-8')
+    return int(hashlib.md5(item).hexdigest(), 16) % shards == shard
+
+
+def topNeighbors(counts, k):
+    """Return the k (neighbor, count) pairs of counts with the highest
+    counts, best first; ties go to the smaller neighbor."""
+    return sorted(counts.items(), key=lambda pair: (-pair[1], pair[0]))[:k]
+
+
+class CooccurrenceCounter(object):
+    """CooccurrenceCounter -- how often items appear in the same list,
+    keeping at most capacity neighbor counters per item"""
+
+    def __init__(self, capacity, shard=0, shards=1):
+        self.capacity = capacity
+        self.shard = shard
+        self.shards = shards
+        self.rows = {}
+        self._owned = {}
+
+    def add(self, items):
+        """Count every pair of distinct items in one list.
+
+        Only rows of items in this counter's shard are kept, so a full
+        pass per shard splits the memory needed between the passes.
+        """
+        items = sorted(set(item for item in items if item))
+        if len(items) < 2:
+            return
+        for item in items:
+            if not self._owns(item):
+                continue
+            row = self.rows.setdefault(item, {})
+            for other in items:
+                if other != item:
+                    self._count(row, other)
+
+    def _owns(self, item):
+        owned = self._owned.get(item)
+        if owned is None:
+            owned = self._owned[item] = inShard(item, self.shard, self.shards)
+        return owned
+
+    def _count(self, row, other):
+        """Count other in row, Misra-Gries style: a full row makes room
+        by taking one off every counter, which undercounts each neighbor
+        by at most lists / capacity but keeps the frequent ones."""
+        if other in row:
+            row[other] += 1
+        elif len(row) < self.capacity:
+            row[other] = 1
+        else:
+            for neighbor in list(row):
+                row[neighbor] -= 1
+                if not row[neighbor]:
+                    del row[neighbor]
+
+    def top(self, k):
+        """Return {item: [(neighbor, count), ...]} with the k most
+        frequent neighbors of every counted item, best first."""
+        return dict((item, topNeighbors(row, k))
+                    for item, row in self.rows.items() if row)
+
+
+def addPairDeltas(deltas, item, others, sign):
+    """Record in deltas ({item: {neighbor: change}}) item joining
+    (sign 1) or leaving (sign -1) a list that holds others."""
+    for other in others:
+        if other == item:
+            continue
+        row = deltas.setdefault(item, {})
+        row[other] = row.get(other, 0) + sign
+        row = deltas.setdefault(other, {})
+        row[item] = row.get(item, 0) + sign
+    return deltas
+
+
+def mergeDeltas(neighbors, changes, k):
+    """Return the k best neighbors once changes ({neighbor: change})
+    are applied to neighbors ([(neighbor, count), ...]).
+
+    Neighbors outside the stored top k start again from zero, so counts
+    drift low until the next full rebuild; ones reaching zero drop out.
+    """
+    counts = dict(neighbors)
+    for other, change in changes.items():
+        counts[other] = counts.get(other, 0) + change
+    return topNeighbors(
+        dict((other, count) for other, count in counts.items() if count > 0), k)
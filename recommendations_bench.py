@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""
+recommendations_bench.py -- Udacity conference server-side Python App Engine
+    benchmark of wishlist co-occurrence counting on synthetic data
+
+$Id$
+
+Generates wishlists over sessions of skewed popularity, then compares
+the bounded CooccurrenceCounter with exact counting: time, counters
+held, and how many of the exact top k neighbors it finds.
+
+    python recommendations_bench.py --profiles 200000 --sessions 5000
+
+"""
+
+import argparse
+import bisect
+import random
+import time
+
+from recommendations import CooccurrenceCounter
+from recommendations import topNeighbors
+
+
+def syntheticWishlists(profiles, sessions, meanLength, skew, seed):
+    """Yield wishlists of session ids; session popularity follows a
+    power law and sessions cluster into tracks people tend to stick to."""
+    rng = random.Random(seed)
+    cumulative, total = [], 0.0
+    for rank in range(sessions):
+        total += 1.0 / (rank + 1) ** skew
+        cumulative.append(total)
+    track_size = 20
+    for _ in range(profiles):
+        length = max(1, int(rng.expovariate(1.0 / meanLength)))
+        picks = set(min(bisect.bisect(cumulative, rng.random() * total),
+                        sessions - 1) for _ in range(length))
+        # half of each wishlist comes from the track of its most popular pick
+        track = min(picks) // track_size * track_size
+        picks.update(rng.randrange(track, min(track + track_size, sessions))
+                     for _ in range(length // 2))
+        yield ['session-%d' % s for s in picks]
+
+
+def exactTop(wishlists, k):
+    counts = {}
+    for items in wishlists:
+        items = sorted(set(items))
+        for item in items:
+            row = counts.setdefault(item, {})
+            for other in items:
+                if other != item:
+                    row[other] = row.get(other, 0) + 1
+    held = sum(len(row) for row in counts.values())
+    return dict((item, topNeighbors(row, k)) for item, row in counts.items()), held
+
+
+def bounded(wishlists, k, capacity, shards):
+    top, held = {}, 0
+    for shard in range(shards):
+        counter = CooccurrenceCounter(capacity, shard, shards)
+        for items in wishlists:
+            counter.add(items)
+        held = max(held, sum(len(row) for row in counter.rows.values()))
+        top.update(counter.top(k))
+    return top, held
+
+
+def recall(exact, approx):
+    found = total = 0
+    for item, neighbors in exact.items():
+        want = set(other for other, _ in neighbors)
+        got = set(other for other, _ in approx.get(item, []))
+        found += len(want & got)
+        total += len(want)
+    return found / float(total or 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[3])
+    parser.add_argument('--profiles', type=int, default=50000)
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--mean-length', type=float, default=8)
+    parser.add_argument('--skew', type=float, default=1.0)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--capacity', type=int, default=50)
+    parser.add_argument('--shards', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    wishlists = list(syntheticWishlists(args.profiles, args.sessions,
+                                        args.mean_length, args.skew, args.seed))
+    print('%d wishlists, %d session ids' % (
+        len(wishlists), len(set(s for w in wishlists for s in w))))
+
+    started = time.time()
+    exact, exact_held = exactTop(wishlists, args.k)
+    exact_seconds = time.time() - started
+
+    started = time.time()
+    approx, approx_held = bounded(wishlists, args.k, args.capacity, args.shards)
+    approx_seconds = time.time() - started
+
+    print('exact:   %6.2fs  %9d counters' % (exact_seconds, exact_held))
+    print('bounded: %6.2fs  %9d counters per pass (capacity %d, %d shards)'
+          % (approx_seconds, approx_held, args.capacity, args.shards))
+    print('top-%d recall: %.3f' % (args.k, recall(exact, approx)))
+
+
+if __name__ == '__main__':
+    main()
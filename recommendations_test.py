@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""
+recommendations_test.py -- Udacity conference server-side Python App Engine
+    unit tests for the wishlist co-occurrence counting helpers
+
+$Id$
+
+"""
+
+import unittest
+
+from recommendations import CooccurrenceCounter
+from recommendations import addPairDeltas
+from recommendations import inShard
+from recommendations import mergeDeltas
+
+LISTS = [['a', 'b', 'c'], ['a', 'b'], ['b', 'c', 'd'], ['a', 'd', 'e'],
+         ['c', 'e'], ['a', 'b', 'e']]
+
+
+class CooccurrenceCounterTest(unittest.TestCase):
+
+    def testExactCountsBelowCapacity(self):
+        counter = CooccurrenceCounter(10)
+        for items in LISTS:
+            counter.add(items)
+        self.assertEqual(counter.rows['a'], {'b': 3, 'c': 1, 'd': 1, 'e': 2})
+        self.assertEqual(counter.rows['e'], {'a': 2, 'b': 1, 'c': 1, 'd': 1})
+
+    def testIgnoresDuplicatesEmptiesAndSingletons(self):
+        counter = CooccurrenceCounter(10)
+        counter.add(['a', 'a', None, 'b'])
+        counter.add(['c'])
+        counter.add([])
+        self.assertEqual(counter.rows, {'a': {'b': 1}, 'b': {'a': 1}})
+
+    def testMisraGriesEvictsWhenFull(self):
+        counter = CooccurrenceCounter(2)
+        counter.add(['a', 'b'])
+        counter.add(['a', 'b'])
+        counter.add(['a', 'c'])
+        # a full row takes one off every counter instead of adding d
+        counter.add(['a', 'd'])
+        self.assertEqual(counter.rows['a'], {'b': 1})
+        counter.add(['a', 'e'])
+        self.assertEqual(counter.rows['a'], {'b': 1, 'e': 1})
+
+    def testFrequentNeighborSurvivesEviction(self):
+        counter = CooccurrenceCounter(2)
+        for other in ['x', 'y', 'z', 'w']:
+            counter.add(['a', 'b'])
+            counter.add(['a', other])
+        self.assertEqual(counter.top(1)['a'][0][0], 'b')
+
+    def testTopSkipsEmptyRowsAndOrdersTies(self):
+        counter = CooccurrenceCounter(1)
+        counter.add(['a', 'b'])
+        counter.add(['a', 'c'])
+        top = counter.top(5)
+        self.assertNotIn('a', top)
+        self.assertEqual(top['b'], [('a', 1)])
+
+    def testShardsSplitRowsBetweenThem(self):
+        whole = CooccurrenceCounter(10)
+        parts = [CooccurrenceCounter(10, shard, 3) for shard in range(3)]
+        for items in LISTS:
+            whole.add(items)
+            for part in parts:
+                part.add(items)
+        merged = {}
+        for shard, part in enumerate(parts):
+            for item in part.rows:
+                self.assertTrue(inShard(item, shard, 3))
+                self.assertNotIn(item, merged)
+            merged.update(part.rows)
+        self.assertEqual(merged, whole.rows)
+
+    def testInShardOwnsEachItemOnce(self):
+        for item in ['a', 'b', u's.caf\xe9', 's.x1']:
+            self.assertEqual(
+                sum(inShard(item, shard, 4) for shard in range(4)), 1)
+            self.assertTrue(inShard(item, 0, 1))
+
+
+class DeltaTest(unittest.TestCase):
+
+    def testAddPairDeltasIsSymmetric(self):
+        deltas = addPairDeltas({}, 'a', ['b', 'a', 'c'], 1)
+        self.assertEqual(deltas, {'a': {'b': 1, 'c': 1},
+                                  'b': {'a': 1}, 'c': {'a': 1}})
+        addPairDeltas(deltas, 'a', ['b'], -1)
+        self.assertEqual(deltas['a'], {'b': 0, 'c': 1})
+
+    def testMergeDeltasDropsCountsReachingZero(self):
+        merged = mergeDeltas([('b', 2), ('c', 1)], {'b': -1, 'c': -1}, 5)
+        self.assertEqual(merged, [('b', 1)])
+
+    def testMergeDeltasAddsNewNeighborsAndKeepsTopK(self):
+        merged = mergeDeltas([('b', 3), ('c', 1)], {'d': 2, 'e': -1}, 2)
+        self.assertEqual(merged, [('b', 3), ('d', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
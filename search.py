@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""
+search.py -- Udacity conference server-side Python App Engine
+    tokenizing & ranking helpers for the keyword search inverted index
+
+$Id$
+
+"""
+
+import math
+import re
+
+# letters & digits only; this also keeps tokens usable as key names
+TOKEN_RE = re.compile(r'[^\W_]+', re.UNICODE)
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 64
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+    'into', 'is', 'it', 'of', 'on', 'or', 'the', 'to', 'with',
+])
+
+
+def tokenize(text):
+    """Return the list of searchable tokens in text, in order."""
+    tokens = []
+    for token in TOKEN_RE.findall((text or '').lower()):
+        if len(token) < MIN_TOKEN_LENGTH or token in STOP_WORDS:
+            continue
+        tokens.append(token[:MAX_TOKEN_LENGTH])
+    return tokens
+
+
+def weighTokens(fields):
+    """Return {token: weight} for a list of (value, boost) pairs.
+
+    A value may be a string or a list of strings (repeated properties);
+    each occurrence of a token adds the boost of the field it came from.
+    """
+    weights = {}
+    for value, boost in fields:
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(v for v in value if v)
+        for token in tokenize(value):
+            weights[token] = weights.get(token, 0.0) + boost
+    return weights
+
+
+def rankDocuments(postings, termCount, frequencies=None):
+    """Return [(doc, score)] ranked best first.
+
+    postings maps each query token to a list of (doc, weight) pairs;
+    frequencies maps tokens to the number of documents they're posted
+    for, when postings only holds some of them. Rare tokens count for
+    more than common ones, and documents matching more of the query
+    terms are favoured over those matching fewer.
+    """
+    frequencies = frequencies or {}
+    scores = {}
+    matched = {}
+    order = []
+    for token, hits in postings.items():
+        if not hits:
+            continue
+        frequency = max(frequencies.get(token, 0), len(hits))
+        idf = 1.0 / (1.0 + math.log(frequency))
+        for doc, weight in hits:
+            if doc not in scores:
+                scores[doc] = 0.0
+                matched[doc] = 0
+                order.append(doc)
+            scores[doc] += weight * idf
+            matched[doc] += 1
+    ranked = [(doc, scores[doc] * matched[doc] / float(termCount or 1))
+              for doc in order]
+    # stable sort keeps first-seen order among equal scores
+    ranked.sort(key=lambda pair: -pair[1])
+    return ranked
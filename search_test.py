@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""
+search_test.py -- Udacity conference server-side Python App Engine
+    unit tests for the keyword search tokenizing & ranking helpers
+
+$Id$
+
+"""
+
+import unittest
+
+from search import MAX_TOKEN_LENGTH
+from search import rankDocuments
+from search import tokenize
+from search import weighTokens
+
+
+class TokenizeTest(unittest.TestCase):
+
+    def testLowercasesAndSplitsOnPunctuation(self):
+        self.assertEqual(tokenize('Cloud-Native Python, 2016!'),
+                         ['cloud', 'native', 'python', '2016'])
+
+    def testDropsStopWordsAndShortTokens(self):
+        self.assertEqual(tokenize('The art of a Go program'),
+                         ['art', 'go', 'program'])
+
+    def testSplitsOnUnderscores(self):
+        self.assertEqual(tokenize('big_data'), ['big', 'data'])
+
+    def testTruncatesLongTokens(self):
+        self.assertEqual(tokenize('x' * 100), ['x' * MAX_TOKEN_LENGTH])
+
+    def testEmptyText(self):
+        self.assertEqual(tokenize(None), [])
+        self.assertEqual(tokenize(''), [])
+
+
+class WeighTokensTest(unittest.TestCase):
+
+    def testAddsBoostPerOccurrence(self):
+        self.assertEqual(weighTokens([('python python', 2.0),
+                                      ('python web', 1.0)]),
+                         {'python': 5.0, 'web': 1.0})
+
+    def testJoinsRepeatedValues(self):
+        self.assertEqual(weighTokens([(['Web', None, 'Mobile'], 2.0)]),
+                         {'web': 2.0, 'mobile': 2.0})
+
+    def testSkipsEmptyFields(self):
+        self.assertEqual(weighTokens([(None, 3.0), ([], 2.0)]), {})
+
+
+class RankDocumentsTest(unittest.TestCase):
+
+    def testFavoursDocumentsMatchingMoreTerms(self):
+        ranked = rankDocuments({'python': [('a', 1.0), ('b', 1.0)],
+                                'web': [('b', 1.0)]}, 2)
+        self.assertEqual([doc for doc, score in ranked], ['b', 'a'])
+
+    def testRareTermsCountForMore(self):
+        ranked = rankDocuments({'common': [('a', 1.0), ('c', 1.0),
+                                           ('d', 1.0)],
+                                'rare': [('b', 1.0)]}, 1)
+        self.assertEqual(ranked[0][0], 'b')
+
+    def testFrequenciesOverrideTruncatedPostings(self):
+        postings = {'common': [('a', 1.0)], 'rare': [('b', 1.0)]}
+        ranked = rankDocuments(postings, 1, {'common': 1000, 'rare': 1})
+        self.assertEqual([doc for doc, score in ranked], ['b', 'a'])
+
+    def testHeavierPostingsRankFirst(self):
+        ranked = rankDocuments({'python': [('a', 1.0), ('b', 3.0)]}, 1)
+        self.assertEqual([doc for doc, score in ranked], ['b', 'a'])
+
+    def testKeepsFirstSeenOrderOnTies(self):
+        ranked = rankDocuments({'python': [('a', 1.0), ('b', 1.0)]}, 1)
+        self.assertEqual([doc for doc, score in ranked], ['a', 'b'])
+
+    def testNoPostings(self):
+        self.assertEqual(rankDocuments({'python': []}, 1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
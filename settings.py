@@ -16,3 +16,26 @@ WEB_CLIENT_ID = '143424984258-6jquuod2dm890gum9om9nq5fl8qpev4k.apps.googleuserco
 ANDROID_CLIENT_ID = 'replace with Android client ID'
 IOS_CLIENT_ID = 'replace with iOS client ID'
 ANDROID_AUDIENCE = WEB_CLIENT_ID
+
+# Admission control for the contended registration write paths: each
+# operation gets a token bucket per conference allowing `rate` requests
+# per second on average and bursts of up to `burst` requests; anything
+# beyond that is refused early with a retry-after hint.
+ADMISSION_CONTROL_ENABLED = True
+ADMISSION_LIMITS = {
+    # operation: (rate, burst)
+    'registerForConference': (5, 20),
+    'addSessionToWishlist': (5, 20),
+    # writes of both kinds to one organizer's conferences & sessions,
+    # which all share the organizer's Profile entity group; a group
+    # sustains about one transaction per second
+    'entityGroup': (1, 3),
+}
+
+# Retry policy for registration & wishlist transactions that collide:
+# up to TXN_RETRY_ATTEMPTS tries, sleeping a random time between 0 and
+# min(TXN_RETRY_MAX_DELAY, TXN_RETRY_BASE_DELAY * 2 ** attempt) seconds
+# before each retry so that colliding clients spread out.
+TXN_RETRY_ATTEMPTS = 5
+TXN_RETRY_BASE_DELAY = 0.05
+TXN_RETRY_MAX_DELAY = 1.0
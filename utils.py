@@ -1,10 +1,86 @@
+import base64
 import json
 import os
+import random
+import re
 import time
 import uuid
 
+from google.appengine.api import datastore_errors
 from google.appengine.api import urlfetch
+from google.appengine.ext import ndb
 from models import Profile
+from settings import TXN_RETRY_ATTEMPTS
+from settings import TXN_RETRY_BASE_DELAY
+from settings import TXN_RETRY_MAX_DELAY
+
+def runInTransaction(func, *args, **kwargs):
+    """Run func in a transaction, retrying collisions after a jittered
+    exponential backoff instead of ndb's fixed immediate retries."""
+    xg = kwargs.pop('xg', False)
+    for attempt in range(TXN_RETRY_ATTEMPTS):
+        try:
+            return ndb.transaction(lambda: func(*args, **kwargs),
+                                   xg=xg, retries=0)
+        except datastore_errors.TransactionFailedError:
+            if attempt == TXN_RETRY_ATTEMPTS - 1:
+                raise
+            time.sleep(random.uniform(
+                0, min(TXN_RETRY_MAX_DELAY, TXN_RETRY_BASE_DELAY * 2 ** attempt)))
+
+SESSION_ID_PREFIX = 's.'
+BASE36 = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+def _base36(number):
+    digits = ''
+    while True:
+        number, digit = divmod(number, 36)
+        digits = BASE36[digit] + digits
+        if not number:
+            return digits
+
+def sessionClientId(key):
+    """Return the short opaque id clients know a Session by.
+
+    Only the organizer's user id & the numeric conference & session ids
+    go in, rather than the app id & kind names a websafe key repeats.
+    """
+    flat = key.flat()
+    if len(flat) != 6:
+        # session still under its old pseudo-conference parent
+        return key.urlsafe()
+    user_id, conf_id, sess_id = flat[1::2]
+    raw = '%s.%s.%s' % (_base36(conf_id), _base36(sess_id), user_id)
+    return SESSION_ID_PREFIX + base64.urlsafe_b64encode(
+        raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def sessionKey(clientId):
+    """Return the Session key of a session client id or websafe key;
+    raise ValueError if it is neither."""
+    if not clientId:
+        raise ValueError('Invalid session id: %r' % clientId)
+    if not clientId.startswith(SESSION_ID_PREFIX):
+        try:
+            return ndb.Key(urlsafe=clientId)
+        except Exception:
+            raise ValueError('Invalid session id: %r' % clientId)
+    encoded = str(clientId[len(SESSION_ID_PREFIX):])
+    try:
+        raw = base64.urlsafe_b64decode(
+            encoded + '=' * (-len(encoded) % 4)).decode('utf-8')
+        conf_id, sess_id, user_id = raw.split('.', 2)
+        return ndb.Key(Profile, user_id, 'Conference', int(conf_id, 36),
+                       'Session', int(sess_id, 36))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid session id: %r' % clientId)
+
+def normalizeTopic(name):
+    """Return the topic dictionary id for a topic name."""
+    return '-'.join(re.findall(r'[^\W_]+', (name or '').lower(), re.UNICODE))
+
+def normalizeEmail(email):
+    """Return the Speaker id for an email address."""
+    return (email or '').strip().lower()
 
 def getUserId(user, id_type="email"):
     if id_type == "email":
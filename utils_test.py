@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""
+utils_test.py -- Udacity conference server-side Python App Engine
+    unit tests for the session client id helpers
+
+$Id$
+
+"""
+
+import base64
+import unittest
+
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from models import Conference
+from models import Profile
+from models import Session
+from utils import SESSION_ID_PREFIX
+from utils import sessionClientId
+from utils import sessionKey
+
+
+def _clientId(raw):
+    return SESSION_ID_PREFIX + base64.urlsafe_b64encode(raw).rstrip('=')
+
+
+class SessionClientIdTest(unittest.TestCase):
+
+    def setUp(self):
+        # keys need an app id to be made websafe
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def testRoundTripsEmailWithDots(self):
+        key = ndb.Key(Profile, 'jane.q.doe@mail.example.com',
+                      Conference, 123456, Session, 789)
+        clientId = sessionClientId(key)
+        self.assertTrue(clientId.startswith(SESSION_ID_PREFIX))
+        self.assertEqual(sessionKey(clientId), key)
+
+    def testIdIsShorterThanWebsafeKey(self):
+        key = ndb.Key(Profile, 'organizer@example.com',
+                      Conference, 5629499534213120, Session, 5066549580791808)
+        self.assertLess(len(sessionClientId(key)), len(key.urlsafe()))
+
+    def testLegacyKeyRoundTripsAsWebsafeKey(self):
+        conf_key = ndb.Key(Profile, 'organizer@example.com', Conference, 42)
+        legacy = ndb.Key(Conference, conf_key.urlsafe(), Session, 7)
+        clientId = sessionClientId(legacy)
+        self.assertEqual(clientId, legacy.urlsafe())
+        self.assertEqual(sessionKey(clientId), legacy)
+
+    def testMalformedIdsRaiseValueError(self):
+        for clientId in [None, '', 'not-a-key', SESSION_ID_PREFIX,
+                         SESSION_ID_PREFIX + '!!!', _clientId('a.b'),
+                         _clientId('!.1.user@example.com')]:
+            self.assertRaises(ValueError, sessionKey, clientId)
+
+
+if __name__ == '__main__':
+    unittest.main()